@@ -2,46 +2,102 @@
 AI Chatbot Application using Streamlit, OpenAI, and LlamaIndex
 Main application file with user interface and interaction handling.
 """
-from typing import Any, Dict
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from itertools import islice
+from pathlib import Path
+from typing import Any, Dict, Tuple
 
 import streamlit as st
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
 
 # Import custom modules
+# Handlers pull in OpenAI, LlamaIndex, ChromaDB and SQLAlchemy, so they are
+# imported lazily on first use (see the _*_cls helpers below).
 from config.settings import settings
-from src.chat_engine import ChatEngine
-from src.database_handler import DatabaseHandler
-from src.document_handler import DocumentHandler
-from src.utils import format_file_size, get_file_hash, get_timestamp
+from src.utils import format_file_size, get_postgres_drivername
 
+# Custom CSS for better UI, kept out of the Python source
+_CSS_PATH = Path(__file__).parent / "static" / "app.css"
 
+
+@dataclass(frozen=True)
+class ModelSpec:
+    """Static metadata for a chat model shown in the model selector."""
+    __slots__ = ("name", "description", "priority")
+
+    name: str
+    description: str
+    priority: int
+
+
+# Known chat models, listed first in the model selector by priority
+_MODELS: Tuple[ModelSpec, ...] = (
+    ModelSpec("gpt-4o", "Latest GPT-4 Omni - Fastest, most capable model", 0),
+    ModelSpec("gpt-4o-mini", "Compact GPT-4 Omni - Fast and cost-effective", 1),
+    ModelSpec("gpt-4-turbo", "GPT-4 Turbo - High performance, good balance", 2),
+    ModelSpec("gpt-4", "Original GPT-4 - Most capable, slower", 3),
+    ModelSpec("gpt-3.5-turbo", "GPT-3.5 Turbo - Fast and economical", 4),
+    ModelSpec("gpt-3.5-turbo-0125", "GPT-3.5 Turbo (Latest) - Improved version", 5),
+    ModelSpec("gpt-3.5-turbo-instruct", "GPT-3.5 Instruct - Optimized for instructions", 6),
+)
+_MODEL_BY_NAME: Dict[str, ModelSpec] = {m.name: m for m in _MODELS}
+_PREFERRED_MODEL_ORDER = tuple(m.name for m in sorted(_MODELS, key=lambda m: m.priority))
+_DEFAULT_MODEL_DESCRIPTION = "OpenAI language model"
+_EMBEDDING_MODEL_PREFIX = "text-embedding"
+
+_TOKEN_TRACKER = None
+
+
+def _tt():
+    """Return the token_tracker module, importing it on first use."""
+    global _TOKEN_TRACKER
+    if _TOKEN_TRACKER is None:
+        from src import token_tracker as token_tracker_module
+        _TOKEN_TRACKER = token_tracker_module
+    return _TOKEN_TRACKER
+
+
+def _chat_engine_cls():
+    """Import ChatEngine on first use."""
+    from src.chat_engine import ChatEngine
+    return ChatEngine
+
+
+def _database_handler_cls():
+    """Import DatabaseHandler on first use."""
+    from src.database_handler import DatabaseHandler
+    return DatabaseHandler
+
+
+def _document_handler_cls():
+    """Import DocumentHandler on first use."""
+    from src.document_handler import DocumentHandler
+    return DocumentHandler
+
+
+@st.cache_data(ttl=3600, max_entries=1, show_spinner=False)
+def _cached_pricing_config():
+    """Load the pricing configuration once and reuse it across reruns."""
+    return _tt().load_pricing_config()
+
+
+@st.cache_data(show_spinner=False)
 def get_available_chat_models():
     """Get list of available chat models from pricing configuration."""
     try:
-        from src.token_tracker import load_pricing_config
-
-        pricing_config = load_pricing_config()
+        pricing_config = _cached_pricing_config()
 
         # Filter out embedding models and keep only chat models
-        chat_models = []
-        for model_name in pricing_config.keys():
-            if isinstance(pricing_config[model_name], dict) and not model_name.startswith('text-embedding'):
-                chat_models.append(model_name)
-
-        # Sort models with preferred order
-        preferred_order = [
-            "gpt-4o", "gpt-4o-mini", "gpt-4-turbo", "gpt-4",
-            "gpt-3.5-turbo", "gpt-3.5-turbo-0125", "gpt-3.5-turbo-instruct"
-        ]
-
-        # Sort available models by preference
-        sorted_models = []
-        for preferred in preferred_order:
-            if preferred in chat_models:
-                sorted_models.append(preferred)
-                chat_models.remove(preferred)
-
-        # Add any remaining models
-        sorted_models.extend(sorted(chat_models))
+        chat_set = {
+            name for name, pricing in pricing_config.items()
+            if isinstance(pricing, dict) and not name.startswith(_EMBEDDING_MODEL_PREFIX)
+        }
+
+        # Preferred models first, then any remaining models alphabetically
+        sorted_models = [m for m in _PREFERRED_MODEL_ORDER if m in chat_set]
+        sorted_models.extend(sorted(chat_set.difference(_PREFERRED_MODEL_ORDER)))
 
         return sorted_models if sorted_models else ["gpt-3.5-turbo", "gpt-4"]
 
@@ -51,31 +107,19 @@ def get_available_chat_models():
         return ["gpt-3.5-turbo", "gpt-4", "gpt-4-turbo"]
 
 
+@st.cache_data(show_spinner=False)
 def get_model_info(model_name):
     """Get information about a specific model."""
     try:
-        from src.token_tracker import load_pricing_config
-
-        pricing_config = load_pricing_config()
+        pricing_config = _cached_pricing_config()
 
         if model_name in pricing_config:
             pricing = pricing_config[model_name]
-
-            # Model descriptions and capabilities
-            model_descriptions = {
-                "gpt-4o": "Latest GPT-4 Omni - Fastest, most capable model",
-                "gpt-4o-mini": "Compact GPT-4 Omni - Fast and cost-effective",
-                "gpt-4-turbo": "GPT-4 Turbo - High performance, good balance",
-                "gpt-4": "Original GPT-4 - Most capable, slower",
-                "gpt-3.5-turbo": "GPT-3.5 Turbo - Fast and economical",
-                "gpt-3.5-turbo-0125": "GPT-3.5 Turbo (Latest) - Improved version",
-                "gpt-3.5-turbo-instruct": "GPT-3.5 Instruct - Optimized for instructions"
-            }
-
+            spec = _MODEL_BY_NAME.get(model_name)
             return {
                 "input_cost": pricing.get("input", 0),
                 "output_cost": pricing.get("output", 0),
-                "description": model_descriptions.get(model_name, "OpenAI language model")
+                "description": spec.description if spec else _DEFAULT_MODEL_DESCRIPTION
             }
     except Exception:
         pass
@@ -83,10 +127,16 @@ def get_model_info(model_name):
     return {
         "input_cost": 0,
         "output_cost": 0,
-        "description": "OpenAI language model"
+        "description": _DEFAULT_MODEL_DESCRIPTION
     }
 
 
+@st.cache_resource(show_spinner=False)
+def _custom_css():
+    """Read the stylesheet once per process and wrap it in a style tag."""
+    return f"<style>\n{_CSS_PATH.read_text(encoding='utf-8')}</style>"
+
+
 def initialize_app():
     """Initialize the Streamlit application."""
     st.set_page_config(
@@ -96,216 +146,247 @@ def initialize_app():
         initial_sidebar_state="expanded"
     )
 
-    # Custom CSS for better UI
-    st.markdown("""
-    <style>
-    .main {
-        padding-top: 1rem;
-    }
-    .stChatMessage {
-        padding: 1rem;
-        border-radius: 0.5rem;
-        margin-bottom: 1rem;
-    }
-    .user-message {
-        background-color: #e3f2fd;
-        border-left: 4px solid #2196f3;
-    }
-    .assistant-message {
-        background-color: #f3e5f5;
-        border-left: 4px solid #9c27b0;
-    }
-    .file-upload-area {
-        border: 2px dashed #cccccc;
-        border-radius: 0.5rem;
-        padding: 1rem;
-        text-align: center;
-        margin: 1rem 0;
-    }
-    .success-message {
-        background-color: #e8f5e8;
-        color: #2e7d32;
-        padding: 0.5rem;
-        border-radius: 0.25rem;
-        margin: 0.5rem 0;
-    }
-    .error-message {
-        background-color: #ffebee;
-        color: #c62828;
-        padding: 0.5rem;
-        border-radius: 0.25rem;
-        margin: 0.5rem 0;
-    }
-    </style>
-    """, unsafe_allow_html=True)
+    # Custom CSS for better UI (must be emitted on every rerun to stay applied)
+    st.markdown(_custom_css(), unsafe_allow_html=True)
 
 
 def initialize_handlers():
     """Initialize application handlers."""
+    # The document handler holds the session's own index and uploads; only
+    # the ChromaDB connection underneath it is shared between sessions.
     if "document_handler" not in st.session_state:
-        st.session_state.document_handler = DocumentHandler()
+        st.session_state.document_handler = _document_handler_cls()()
+
+    # Hashes of files already uploaded in this session, for O(1) duplicate checks
+    if "known_hashes" not in st.session_state:
+        st.session_state.known_hashes = set(
+            st.session_state.document_handler.get_uploaded_files().keys())
 
+    # The database handler holds the user's own connection, so it stays
+    # per-session rather than being shared through the resource cache.
     if "database_handler" not in st.session_state:
-        st.session_state.database_handler = DatabaseHandler()
+        st.session_state.database_handler = _database_handler_cls()()
 
     if "chat_engine" not in st.session_state:
-        st.session_state.chat_engine = ChatEngine(
+        st.session_state.chat_engine = _chat_engine_cls()(
             st.session_state.document_handler,
             st.session_state.database_handler
         )
 
+    # Set once the user sends a message; hides the welcome box without
+    # touching the conversation history on every rerun.
+    st.session_state.setdefault("_shown_welcome", False)
 
-def render_sidebar():
-    """Render the application sidebar."""
-    st.sidebar.title("🤖 AI Chatbot")
-    st.sidebar.markdown("---")
-
-    # File Upload Section
-    render_file_upload_section()
 
-    st.sidebar.markdown("---")
+def render_sidebar():
+    """Render the application sidebar.
 
-    # Database Connection Section
-    render_database_section()
+    Each section emits its own separator together with its heading, which
+    keeps the number of elements sent to the browser per rerun down.
+    """
+    st.sidebar.title("🤖 AI Chatbot")
 
-    st.sidebar.markdown("---")
+    # These sections are fragments, so a widget inside one reruns only that
+    # section. Fragments cannot write through st.sidebar, so they run in it.
+    with st.sidebar:
+        # File Upload Section
+        render_file_upload_section()
 
-    # Settings Section
-    render_settings_section()
+        # Database Connection Section
+        render_database_section()
 
-    st.sidebar.markdown("---")
+        # Settings Section
+        render_settings_section()
 
     # Pricing Management Section
     render_pricing_section()
 
-    st.sidebar.markdown("---")
-
     # Usage Summary Section
-    render_usage_summary()
+    with st.sidebar:
+        render_usage_summary()
 
 
 def render_pricing_section():
     """Render pricing management section in sidebar."""
-    st.sidebar.subheader("💰 Pricing Management")
-
-    if hasattr(st.session_state, 'chat_engine') and st.session_state.chat_engine:
-        from src.token_tracker import token_tracker
-
-        # Get pricing info
-        pricing_info = token_tracker.get_pricing_info()
-
-        # Display current pricing source
-        st.sidebar.info(f"Source: {pricing_info['pricing_source']}")
-        st.sidebar.caption(f"Last updated: {pricing_info['last_updated']}")
-        st.sidebar.caption(f"Models: {pricing_info['models_count']}")
-
-        # Refresh pricing button
-        if st.sidebar.button("🔄 Refresh Pricing", help="Reload pricing from config file"):
-            if token_tracker.refresh_pricing():
-                st.sidebar.success("Pricing refreshed!")
-                st.rerun()
-            else:
-                st.sidebar.error("Failed to refresh pricing")
-
-        # Show update instructions
-        with st.sidebar.expander("📝 Update Pricing"):
-            st.write("**Manual update:**")
-            st.code("Edit config/openai_pricing.json")
-
-            st.write("**Automated update:**")
-            st.code("python update_pricing.py --method auto")
+    st.sidebar.markdown("---")
 
-            st.write("**Available methods:**")
-            st.caption("• auto: Try all methods")
-            st.caption("• github: Community repo")
-            st.caption("• web_scrape: OpenAI website")
-            st.caption("• manual: Edit config file")
-    else:
-        st.sidebar.info("Chat engine not initialized")
+    # Collapsed by default; most sessions never open it
+    with st.sidebar.expander("💰 Pricing Management", expanded=False):
+        if hasattr(st.session_state, 'chat_engine') and st.session_state.chat_engine:
+            token_tracker = _tt().token_tracker
+
+            # Get pricing info
+            pricing_info = token_tracker.get_pricing_info()
+
+            # Display current pricing source
+            st.info(f"Source: {pricing_info['pricing_source']}")
+            st.caption(f"Last updated: {pricing_info['last_updated']}")
+            st.caption(f"Models: {pricing_info['models_count']}")
+
+            # Refresh pricing button
+            if st.button("🔄 Refresh Pricing", help="Reload pricing from config file"):
+                if token_tracker.refresh_pricing():
+                    _cached_pricing_config.clear()
+                    get_available_chat_models.clear()
+                    get_model_info.clear()
+                    st.success("Pricing refreshed!")
+                    st.rerun()
+                else:
+                    st.error("Failed to refresh pricing")
+
+            # Show update instructions (expanders cannot be nested)
+            st.markdown("""
+**📝 Update Pricing**
+
+**Manual update:**
+```
+Edit config/openai_pricing.json
+```
+**Automated update:**
+```
+python update_pricing.py --method auto
+```
+**Available methods:**
+- auto: Try all methods
+- github: Community repo
+- web_scrape: OpenAI website
+- manual: Edit config file
+""")
+        else:
+            st.info("Chat engine not initialized")
 
 
+@st.fragment
 def render_file_upload_section():
     """Render the file upload section in sidebar."""
-    st.sidebar.subheader("📁 Document Upload")
+    st.markdown("---\n### 📁 Document Upload")
+
+    document_handler = st.session_state.document_handler
 
     # File upload widget
-    uploaded_files = st.sidebar.file_uploader(
+    uploaded_files = st.file_uploader(
         "Upload documents",
         type=settings.SUPPORTED_FILE_TYPES,
         accept_multiple_files=True,
-        help=f"Supported formats: {', '.join([t.upper() for t in settings.SUPPORTED_FILE_TYPES])}\nMax size: {settings.MAX_FILE_SIZE_MB}MB per file"
+        help=f"Supported formats: {settings.SUPPORTED_FILE_TYPES_DISPLAY}\nMax size: {settings.MAX_FILE_SIZE_MB}MB per file"
     )
 
     # Process uploaded files
     if uploaded_files:
+        pending = []
         for uploaded_file in uploaded_files:
-            process_uploaded_file(uploaded_file)
+            saved = process_uploaded_file(uploaded_file)
+            if saved:
+                pending.append(saved)
 
-    # Display uploaded files
-    display_uploaded_files()
+        if pending:
+            process_saved_documents(pending)
+
+    # Display uploaded files (read once, after any uploads above)
+    display_uploaded_files(document_handler.get_uploaded_files())
 
     # Clear all documents button
-    if st.sidebar.button("🗑️ Clear All Documents", type="secondary"):
-        if st.session_state.document_handler.clear_all_documents():
-            st.sidebar.success("All documents cleared!")
+    if st.button("🗑️ Clear All Documents", type="secondary"):
+        if document_handler.clear_all_documents():
+            st.session_state.known_hashes.clear()
+            st.success("All documents cleared!")
             st.rerun()
 
 
 def process_uploaded_file(uploaded_file):
-    """Process a single uploaded file."""
-    document_handler = st.session_state.document_handler
+    """Hash, validate and save a single uploaded file.
 
-    # Check if file is already uploaded
-    file_content = uploaded_file.read()
-    uploaded_file.seek(0)  # Reset file pointer
+    Returns (name, file_path, file_hash) for a newly saved file, else None.
+    """
+    document_handler = st.session_state.document_handler
+    known_hashes = st.session_state.known_hashes
 
-    file_hash = get_file_hash(file_content)
-    uploaded_files = document_handler.get_uploaded_files()
+    # Check if file is already uploaded (hashing streams and rewinds the file)
+    file_hash = document_handler.get_file_hash_stream(uploaded_file)
 
-    if file_hash in uploaded_files:
-        st.sidebar.info(f"File '{uploaded_file.name}' already uploaded")
-        return
+    if file_hash in known_hashes:
+        st.info(f"File '{uploaded_file.name}' already uploaded")
+        return None
 
     # Validate file
     validation_result = document_handler.validate_file(uploaded_file)
 
     if not validation_result["is_valid"]:
-        st.sidebar.error(validation_result["error_message"])
-        return
+        st.error(validation_result["error_message"])
+        return None
 
-    # Show upload progress
-    with st.sidebar:
-        with st.spinner(f"Uploading {uploaded_file.name}..."):
-            # Save file
-            file_path = document_handler.save_uploaded_file(uploaded_file)
+    # Save file
+    file_path = document_handler.save_uploaded_file(uploaded_file, file_hash)
+    if not file_path:
+        return None
 
-            if file_path:
-                # Process document
-                with st.spinner(f"Processing {uploaded_file.name}..."):
-                    success = document_handler.process_document(
-                        file_path, file_hash)
+    known_hashes.add(file_hash)
+    return uploaded_file.name, file_path, file_hash
 
-                    if success:
-                        st.success(
-                            f"✅ {uploaded_file.name} uploaded and processed!")
-                        st.rerun()
-                    else:
-                        st.error(f"❌ Failed to process {uploaded_file.name}")
 
+def process_saved_documents(pending):
+    """Extract saved documents concurrently, then index them in one batch.
 
-def display_uploaded_files():
-    """Display list of uploaded files with delete options."""
-    uploaded_files = st.session_state.document_handler.get_uploaded_files()
+    Text extraction is independent per file, so it runs in a small thread
+    pool; the extracted documents are then embedded and indexed together.
+    """
+    document_handler = st.session_state.document_handler
+    ctx = get_script_run_ctx()
+
+    def attach_ctx():
+        # Workers read st.session_state, which needs the script run context
+        add_script_run_ctx(threading.current_thread(), ctx)
+
+    progress = st.progress(0.0, text=f"Processing {len(pending)} file(s)...")
+
+    loaded = []
+    with ThreadPoolExecutor(max_workers=min(8, len(pending)),
+                            initializer=attach_ctx) as executor:
+        futures = {
+            executor.submit(document_handler.load_document, file_path, file_hash): name
+            for name, file_path, file_hash in pending
+        }
+
+        for done, future in enumerate(as_completed(futures), start=1):
+            name = futures[future]
+            progress.progress(done / len(futures), text=f"Extracted {done}/{len(futures)}")
+
+            documents = future.result()
+            if documents:
+                loaded.append((name, documents))
+            else:
+                st.error(f"❌ Failed to process {name}")
+
+    indexed = False
+    if loaded:
+        progress.progress(1.0, text=f"Indexing {len(loaded)} file(s)...")
+        indexed = document_handler.index_documents(
+            [document for _, documents in loaded for document in documents])
+        for name, _ in loaded:
+            if indexed:
+                st.success(f"✅ {name} uploaded and processed!")
+            else:
+                st.error(f"❌ Failed to process {name}")
+
+    progress.empty()
 
+    if indexed:
+        st.rerun()
+
+
+def display_uploaded_files(uploaded_files: Dict[str, Dict]):
+    """Display list of uploaded files with delete options."""
     if not uploaded_files:
-        st.sidebar.info("No documents uploaded yet")
+        st.info("No documents uploaded yet")
         return
 
-    st.sidebar.subheader(f"📄 Uploaded Files ({len(uploaded_files)})")
+    st.subheader(f"📄 Uploaded Files ({len(uploaded_files)})")
+
+    document_handler = st.session_state.document_handler
 
     for file_hash, file_metadata in uploaded_files.items():
-        with st.sidebar.container():
-            col1, col2 = st.sidebar.columns([3, 1])
+        with st.container():
+            col1, col2 = st.columns([3, 1])
 
             with col1:
                 st.write(f"**{file_metadata['original_name']}**")
@@ -320,32 +401,34 @@ def display_uploaded_files():
 
             with col2:
                 if st.button("🗑️", key=f"delete_{file_hash}", help="Delete file"):
-                    if st.session_state.document_handler.delete_document(file_hash):
+                    if document_handler.delete_document(file_hash):
+                        st.session_state.known_hashes.discard(file_hash)
                         st.success("File deleted!")
                         st.rerun()
                     else:
                         st.error("Failed to delete file")
 
 
+@st.fragment
 def render_database_section():
     """Render the database connection section in sidebar."""
-    st.sidebar.subheader("🗄️ Database Connection")
+    st.markdown("---\n### 🗄️ Database Connection")
 
     database_handler = st.session_state.database_handler
 
     # Connection status
     if database_handler.get_connection_status():
-        st.sidebar.success("✅ Connected to database")
+        st.success("✅ Connected to database")
 
         # Database info
         db_info = database_handler.get_database_info()
         if db_info:
-            st.sidebar.info(f"Tables: {db_info.get('total_tables', 0)}")
+            st.info(f"Tables: {db_info.get('total_tables', 0)}")
 
         # Disconnect button
-        if st.sidebar.button("Disconnect", type="secondary"):
+        if st.button("Disconnect", type="secondary"):
             database_handler.disconnect_from_database()
-            st.sidebar.success("Disconnected from database")
+            st.success("Disconnected from database")
             st.rerun()
 
         # Table browser
@@ -355,9 +438,30 @@ def render_database_section():
         render_database_connection_form()
 
 
+def _build_connection_url(host, port, database, username, password):
+    """Build a PostgreSQL URL with credentials escaped by SQLAlchemy."""
+    from sqlalchemy.engine import URL
+
+    try:
+        port = int(port)
+    except ValueError:
+        return None
+
+    return URL.create(
+        get_postgres_drivername(),
+        username=username,
+        password=password,
+        host=host,
+        port=port,
+        database=database
+    )
+
+
 def render_database_connection_form():
     """Render database connection form."""
-    with st.sidebar.form("db_connection_form"):
+    database_handler = st.session_state.database_handler
+
+    with st.form("db_connection_form"):
         st.write("**Connection Details**")
 
         host = st.text_input("Host", value=settings.POSTGRES_HOST)
@@ -381,10 +485,14 @@ def render_database_connection_form():
             if not all([host, port, database, username, password]):
                 st.error("Please fill in all connection details")
             else:
-                connection_string = f"postgresql://{username}:{password}@{host}:{port}/{database}"
+                connection_string = _build_connection_url(
+                    host, port, database, username, password)
 
-                if test_clicked:
-                    success, message = st.session_state.database_handler.test_connection(
+                if connection_string is None:
+                    st.error("Port must be a number")
+
+                elif test_clicked:
+                    success, message = database_handler.test_connection(
                         connection_string)
                     if success:
                         st.success(message)
@@ -393,26 +501,31 @@ def render_database_connection_form():
 
                 elif connect_clicked:
                     with st.spinner("Connecting to database..."):
-                        if st.session_state.database_handler.connect_to_database(connection_string):
+                        if database_handler.connect_to_database(connection_string):
                             st.success("Connected successfully!")
                             st.rerun()
                         else:
                             st.error("Failed to connect to database")
 
 
+@st.fragment
 def render_table_browser():
-    """Render table browser for connected database."""
+    """Render table browser for connected database.
+
+    Runs as a fragment (inside the sidebar) so picking a table only reruns
+    this block instead of the whole app.
+    """
     database_handler = st.session_state.database_handler
     available_tables = database_handler.get_available_tables()
 
     if not available_tables:
-        st.sidebar.info("No tables found in database")
+        st.info("No tables found in database")
         return
 
-    st.sidebar.subheader(f"📊 Tables ({len(available_tables)})")
+    st.subheader(f"📊 Tables ({len(available_tables)})")
 
     # Table selection
-    selected_table = st.sidebar.selectbox(
+    selected_table = st.selectbox(
         "Select table to preview",
         options=[""] + available_tables,
         key="selected_table"
@@ -422,59 +535,72 @@ def render_table_browser():
         # Show table schema
         schema_info = database_handler.get_table_schema(selected_table)
         if schema_info:
-            st.sidebar.write(f"**{selected_table}**")
-            st.sidebar.caption(f"Schema: {schema_info['schema']}")
+            st.write(f"**{selected_table}**")
+            st.caption(f"Schema: {schema_info['schema']}")
 
             # Show columns
-            with st.sidebar.expander("Columns"):
+            with st.expander("Columns"):
                 for col in schema_info['columns']:
                     st.write(f"• {col['name']} ({col['type']})")
 
         # Preview button
-        if st.sidebar.button("Preview Data", key=f"preview_{selected_table}"):
+        if st.button("Preview Data", key=f"preview_{selected_table}"):
             preview_data = database_handler.get_table_preview(selected_table)
             if preview_data is not None:
                 st.session_state.preview_data = preview_data
                 st.session_state.preview_table = selected_table
+                # The preview is shown in the main area, outside the fragment
+                st.rerun()
 
 
+@st.fragment
 def render_settings_section():
     """Render settings section in sidebar."""
-    st.sidebar.subheader("⚙️ Settings")
-
-    # Temperature setting
-    temperature = st.sidebar.slider(
-        "Temperature",
-        min_value=0.0,
-        max_value=2.0,
-        value=st.session_state.get(
-            'temperature', settings.DEFAULT_TEMPERATURE),
-        step=0.1,
-        help="Controls randomness in responses. Lower values are more focused and deterministic."
-    )
-    st.session_state.temperature = temperature
+    st.markdown("---\n### ⚙️ Settings")
 
     # Model selection - dynamic list from pricing config
     available_models = get_available_chat_models()
+    model_index = {name: i for i, name in enumerate(available_models)}
     current_model = st.session_state.get('model', settings.DEFAULT_MODEL)
 
-    # Ensure current model is in the list, if not use first available
-    if current_model not in available_models:
-        current_model = available_models[0]
+    # Batch the settings widgets in a form so tweaking them doesn't rerun the
+    # whole app until the user applies the change
+    with st.form("settings_form"):
+        # Temperature setting
+        temperature = st.slider(
+            "Temperature",
+            min_value=0.0,
+            max_value=2.0,
+            value=st.session_state.get(
+                'temperature', settings.DEFAULT_TEMPERATURE),
+            step=0.1,
+            help="Controls randomness in responses. Lower values are more focused and deterministic."
+        )
 
-    model = st.sidebar.selectbox(
-        "Model",
-        options=available_models,
-        index=available_models.index(
-            current_model) if current_model in available_models else 0,
-        help="Select the OpenAI model to use for responses. Models are sorted by performance and cost."
-    )
-    st.session_state.model = model
+        # Fall back to the first available model if the current one is unknown
+        model = st.selectbox(
+            "Model",
+            options=available_models,
+            index=model_index.get(current_model, 0),
+            help="Select the OpenAI model to use for responses. Models are sorted by performance and cost."
+        )
+
+        applied = st.form_submit_button("Apply Settings")
+
+    if applied:
+        st.session_state.temperature = temperature
+        st.session_state.model = model
+    elif current_model in model_index:
+        # Show info for the applied model, not an unsubmitted selection
+        model = current_model
+    else:
+        # Stored model is no longer offered; switch to the first available
+        st.session_state.model = model
 
     # Show model information
     if model:
         model_info = get_model_info(model)
-        with st.sidebar.expander("ℹ️ Model Information"):
+        with st.expander("ℹ️ Model Information"):
             st.write(f"**{model}**")
             st.caption(model_info["description"])
 
@@ -493,58 +619,54 @@ def render_settings_section():
                 )
 
     # Clear chat button
-    if st.sidebar.button("🧹 Clear Chat History", type="secondary"):
+    if st.button("🧹 Clear Chat History", type="secondary"):
         st.session_state.chat_engine.clear_conversation()
-        st.sidebar.success("Chat history cleared!")
+        st.session_state._shown_welcome = False
+        st.success("Chat history cleared!")
         st.rerun()
 
 
+@st.fragment
 def render_usage_summary():
     """Render session usage summary in sidebar."""
-    st.sidebar.subheader("💰 Session Usage")
-
-    # Get session totals from token tracker
-    if hasattr(st.session_state, 'chat_engine') and st.session_state.chat_engine:
-        # Calculate totals from all messages
-        total_input_tokens = 0
-        total_output_tokens = 0
-        total_cost = 0.0
-
-        messages = st.session_state.chat_engine.get_conversation_history()
-        for message in messages:
-            if message.get("role") == "assistant" and message.get("metadata", {}).get("token_usage"):
-                usage = message["metadata"]["token_usage"]
-                total_input_tokens += usage.get("input_tokens", 0)
-                total_output_tokens += usage.get("output_tokens", 0)
-                total_cost += usage.get("cost", 0.0)
-
-        # Display metrics
-        if total_input_tokens > 0 or total_output_tokens > 0:
-            col1, col2 = st.sidebar.columns(2)
-
-            with col1:
+    st.markdown("---")
+
+    with st.expander("💰 Session Usage", expanded=False):
+        # Get session totals from token tracker
+        if hasattr(st.session_state, 'chat_engine') and st.session_state.chat_engine:
+            # Totals are accumulated by the chat engine as responses arrive
+            usage_totals = st.session_state.usage_totals
+            total_input_tokens = usage_totals["input_tokens"]
+            total_output_tokens = usage_totals["output_tokens"]
+            total_cost = usage_totals["cost"]
+
+            # Display metrics
+            if total_input_tokens > 0 or total_output_tokens > 0:
+                col1, col2 = st.columns(2)
+
+                with col1:
+                    st.metric(
+                        label="Input",
+                        value=f"{total_input_tokens:,}"
+                    )
+
+                with col2:
+                    st.metric(
+                        label="Output",
+                        value=f"{total_output_tokens:,}"
+                    )
+
+                total_tokens = total_input_tokens + total_output_tokens
                 st.metric(
-                    label="Input",
-                    value=f"{total_input_tokens:,}"
+                    label="Total Cost",
+                    value=f"${total_cost:.4f}"
                 )
 
-            with col2:
-                st.metric(
-                    label="Output",
-                    value=f"{total_output_tokens:,}"
-                )
-
-            total_tokens = total_input_tokens + total_output_tokens
-            st.sidebar.metric(
-                label="Total Cost",
-                value=f"${total_cost:.4f}"
-            )
-
-            st.sidebar.caption(f"Total: {total_tokens:,} tokens")
+                st.caption(f"Total: {total_tokens:,} tokens")
+            else:
+                st.info("No usage data yet")
         else:
-            st.sidebar.info("No usage data yet")
-    else:
-        st.sidebar.info("Chat engine not initialized")
+            st.info("Chat engine not initialized")
 
 
 def render_main_content():
@@ -554,6 +676,15 @@ def render_main_content():
         "Ask me anything about your documents, database, or general questions!")
 
     # Show preview data if available
+    render_table_preview()
+
+    # Chat interface
+    render_chat_interface()
+
+
+@st.fragment
+def render_table_preview():
+    """Render the selected table preview, rerunning on its own when cleared."""
     if hasattr(st.session_state, 'preview_data') and st.session_state.preview_data is not None:
         st.subheader(f"📊 Table Preview: {st.session_state.preview_table}")
         st.dataframe(st.session_state.preview_data, use_container_width=True)
@@ -563,10 +694,7 @@ def render_main_content():
         if st.button("Clear Preview"):
             del st.session_state.preview_data
             del st.session_state.preview_table
-            st.rerun()
-
-    # Chat interface
-    render_chat_interface()
+            st.rerun(scope="fragment")
 
 
 def render_chat_interface():
@@ -574,19 +702,31 @@ def render_chat_interface():
     # Display chat history
     messages = st.session_state.chat_engine.get_conversation_history()
 
+    # Only the most recent window is rendered; indices stay absolute so
+    # widget keys don't change as the window moves
+    start = max(len(messages) - settings.MAX_RENDERED_MESSAGES, 0)
+
     # Chat container
     chat_container = st.container()
 
     with chat_container:
-        for index, message in enumerate(messages):
+        if start:
+            st.caption(f"Showing the last {len(messages) - start} of {len(messages)} messages")
+
+        for index, message in enumerate(islice(messages, start, None), start=start):
             render_chat_message(message, index)
 
     # Chat input
     render_chat_input()
 
 
+@st.fragment
 def render_chat_message(message: Dict[str, Any], message_index: int = 0):
-    """Render a single chat message."""
+    """Render a single chat message.
+
+    Each message is its own fragment, so opening an expander or downloading
+    results only reruns that message instead of replaying the whole history.
+    """
     role = message["role"]
     content = message["content"]
     metadata = message.get("metadata", {})
@@ -671,20 +811,46 @@ def render_database_results(metadata, message_index: int = 0):
         with st.expander("📊 Query Results"):
             st.dataframe(data, use_container_width=True)
 
-            # Download button for results with unique key using message index
-            csv = data.to_csv(index=False)
-            timestamp = get_timestamp().replace(':', '-').replace(' ', '_').replace('.', '_')
-            # Create unique key using message index, timestamp and data hash
-            data_hash = abs(hash(str(data.values.tolist()))) % 10000
-            unique_key = f"download_csv_msg_{message_index}_{timestamp}_{data_hash}"
-
-            st.download_button(
-                label="📥 Download CSV",
-                data=csv,
-                file_name=f"query_results_{timestamp}.csv",
-                mime="text/csv",
-                key=unique_key
-            )
+            render_csv_download(data, metadata, message_index)
+
+
+def _write_csv(df) -> bytes:
+    """Serialize query results to CSV bytes."""
+    return df.to_csv(index=False).encode("utf-8")
+
+
+@st.cache_data(show_spinner=False)
+def _df_to_csv(df_hash: str, _df) -> bytes:
+    """CSV bytes for query results, cached on their content digest.
+
+    The leading underscore tells Streamlit not to hash the DataFrame itself;
+    df_hash must identify its content (see ChatEngine._hash_dataframe),
+    since the cache is shared by every session.
+    """
+    return _write_csv(_df)
+
+
+@st.fragment
+def render_csv_download(data, metadata, message_index: int = 0):
+    """Render the CSV download button for query results."""
+    # Download button for results with unique key using message index
+    # Hash and filename are computed once when the message is created
+    data_hash = metadata.get("data_hash")
+    if data_hash is None:
+        # Without a content digest there is no safe cache key
+        csv = _write_csv(data)
+        unique_key = f"download_csv_msg_{message_index}"
+    else:
+        csv = _df_to_csv(data_hash, data)
+        unique_key = f"download_csv_msg_{message_index}_{data_hash}"
+
+    st.download_button(
+        label="📥 Download CSV",
+        data=csv,
+        file_name=metadata.get("csv_filename", "query_results.csv"),
+        mime="text/csv",
+        key=unique_key
+    )
 
 
 def render_chat_input():
@@ -693,11 +859,17 @@ def render_chat_input():
     user_input = st.chat_input("Type your message here...")
 
     if user_input:
-        # Process the message
-        with st.spinner("Thinking..."):
-            st.session_state.chat_engine.process_message(user_input)
+        st.session_state._shown_welcome = True
+
+        with st.chat_message("user"):
+            st.write(user_input)
+
+        # Stream the reply as it is generated
+        with st.chat_message("assistant"):
+            st.write_stream(
+                st.session_state.chat_engine.stream_message(user_input))
 
-        # Rerun to show the new messages
+        # Rerun to show sources, results and updated usage for the new message
         st.rerun()
 
 
@@ -719,7 +891,7 @@ def main():
     render_main_content()
 
     # Show instructions for new users
-    if not st.session_state.chat_engine.get_conversation_history():
+    if not st.session_state._shown_welcome:
         with st.container():
             st.info("""
             👋 **Welcome to AI Chatbot!**
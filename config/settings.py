@@ -19,11 +19,24 @@ class Settings:
     POSTGRES_DATABASE = os.getenv("POSTGRES_DATABASE")
     POSTGRES_USERNAME = os.getenv("POSTGRES_USERNAME")
     POSTGRES_PASSWORD = os.getenv("POSTGRES_PASSWORD")
+    DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+    DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "5"))
+    DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "300"))
+    DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30"))
+    # Set to false behind PgBouncer in transaction mode, where the extra
+    # ping per checkout leaves server connections idle in transaction
+    DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+    # Upper bound for user-driven queries (SQL, previews, access checks)
+    DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "30000"))
+    # Most rows read back for a natural-language query
+    MAX_QUERY_ROWS = int(os.getenv("MAX_QUERY_ROWS", "1000"))
 
     # File Configuration
     MAX_FILE_SIZE_MB = int(os.getenv("MAX_FILE_SIZE_MB", "10"))
     MAX_DOCUMENTS = int(os.getenv("MAX_DOCUMENTS", "100"))
     UPLOAD_DIR = "uploads"
+    # Upload dedup hash: auto, xxh3, blake3, blake2b or sha256
+    HASH_ALGO = os.getenv("HASH_ALGO", "auto").lower()
     DATA_DIR = "data"
 
     # Default Model Settings
@@ -31,10 +44,19 @@ class Settings:
     DEFAULT_MODEL = "gpt-3.5-turbo"
     DEFAULT_CHUNK_SIZE = 1000
     DEFAULT_CHUNK_OVERLAP = 200
+    # Embedding batches sent to OpenAI at the same time when indexing
+    EMBED_CONCURRENCY = int(os.getenv("EMBED_CONCURRENCY", "5"))
     MAX_CONVERSATION_HISTORY = 20
+    # Stored messages (user + assistant) kept per session
+    MAX_CHAT_HISTORY = MAX_CONVERSATION_HISTORY * 2
+    # Most recent messages rendered in the chat view
+    MAX_RENDERED_MESSAGES = MAX_CONVERSATION_HISTORY
 
     # Supported File Types
     SUPPORTED_FILE_TYPES = ["pdf", "txt", "docx"]
+    SUPPORTED_FILE_TYPES_DISPLAY = ", ".join(t.upper() for t in SUPPORTED_FILE_TYPES)
+    # Set form for O(1) extension checks
+    SUPPORTED_FILE_TYPES_SET = frozenset(SUPPORTED_FILE_TYPES)
 
     @property
     def postgres_connection_string(self):
@@ -2,17 +2,34 @@
 Docker Database Management Script for AI Chatbot
 Provides easy commands to manage the PostgreSQL database using Docker.
 """
+import os
+import socket
+import struct
 import subprocess
 import time
-import os
+
+try:
+    import psycopg2
+except ImportError:
+    psycopg2 = None
+
+POSTGRES_HOST = "localhost"
+POSTGRES_PORT = 5432
+POSTGRES_CONTAINER = "ai-chatbot-postgres"
+POSTGRES_DB = "ai_chatbot"
+POSTGRES_USER = "chatbot_user"
+POSTGRES_PASSWORD = "chatbot_password"
+
+# Postgres SSLRequest packet; the server replies with a single 'S' or 'N'
+_SSL_REQUEST = struct.pack("!ii", 8, 80877103)
 
 
 def run_command(command, description):
-    """Run a shell command and handle errors."""
+    """Run a command (argv list, no shell) and handle errors."""
     print(f"🔄 {description}...")
     try:
-        result = subprocess.run(command, shell=True,
-                                check=True, capture_output=True, text=True)
+        result = subprocess.run(command, check=True,
+                                capture_output=True, text=True)
         print(f"✅ {description} completed successfully!")
         if result.stdout:
             print(result.stdout)
@@ -22,16 +39,43 @@ def run_command(command, description):
         if e.stderr:
             print(f"Error: {e.stderr}")
         return False
+    except FileNotFoundError:
+        print(f"❌ {description} failed!")
+        print(f"Error: command not found: {command[0]}")
+        return False
+
+
+def stream_command(command, description):
+    """Run a command and print its output line by line as it arrives."""
+    print(f"🔄 {description}...")
+    try:
+        with subprocess.Popen(command, stdout=subprocess.PIPE,
+                              stderr=subprocess.STDOUT, text=True,
+                              bufsize=1) as proc:
+            try:
+                for line in proc.stdout:
+                    print(line, end="")
+            except KeyboardInterrupt:
+                proc.terminate()
+        if proc.returncode:
+            print(f"❌ {description} failed!")
+            return False
+        print(f"✅ {description} completed successfully!")
+        return True
+    except FileNotFoundError:
+        print(f"❌ {description} failed!")
+        print(f"Error: command not found: {command[0]}")
+        return False
 
 
 def check_docker():
     """Check if Docker is installed and running."""
     print("🐳 Checking Docker installation...")
     try:
-        subprocess.run(["docker", "--version"],
-                       check=True, capture_output=True)
-        subprocess.run(["docker-compose", "--version"],
-                       check=True, capture_output=True)
+        subprocess.run(["docker", "--version"], check=True,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        subprocess.run(["docker-compose", "--version"], check=True,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
         print("✅ Docker and Docker Compose are available")
         return True
     except (subprocess.CalledProcessError, FileNotFoundError):
@@ -40,6 +84,90 @@ def check_docker():
         return False
 
 
+def postgres_accepting(host=POSTGRES_HOST, port=POSTGRES_PORT, timeout=1.0):
+    """Return True once the Postgres server answers on host:port.
+
+    With psycopg2 installed this opens (and closes) a real connection, which
+    also waits out the "database system is starting up" phase. Otherwise a
+    protocol-level SSLRequest is sent, since a bare TCP connect can succeed
+    against Docker's port proxy before Postgres is listening.
+    """
+    if psycopg2 is not None:
+        try:
+            psycopg2.connect(host=host, port=port, dbname=POSTGRES_DB,
+                             user=POSTGRES_USER, password=POSTGRES_PASSWORD,
+                             connect_timeout=max(1, int(timeout))).close()
+            return True
+        except psycopg2.OperationalError:
+            return False
+
+    try:
+        with socket.create_connection((host, port), timeout=timeout) as sock:
+            sock.sendall(_SSL_REQUEST)
+            return sock.recv(1) in (b"S", b"N")
+    except OSError:
+        return False
+
+
+def wait_for_postgres(max_attempts=30):
+    """Probe the Postgres port with exponential backoff until it answers."""
+    for attempt in range(max_attempts):
+        if postgres_accepting():
+            return True
+        if attempt < max_attempts - 1:
+            print(
+                f"⏳ Attempt {attempt + 1}/{max_attempts} - Database not ready yet, waiting...")
+            # Exponential backoff: 0.1s, 0.2s, ... capped at 2s
+            time.sleep(min(0.1 * 2 ** attempt, 2))
+    return False
+
+
+def container_health(container):
+    """Return the container's health status, or None without a healthcheck."""
+    try:
+        result = subprocess.run(
+            ["docker", "inspect", "--format",
+             "{{if .State.Health}}{{.State.Health.Status}}{{end}}", container],
+            check=True, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+            text=True)
+    except (subprocess.CalledProcessError, FileNotFoundError):
+        return None
+    return result.stdout.strip() or None
+
+
+def wait_for_healthy(container, timeout=60):
+    """Wait for Docker to report the container healthy.
+
+    Blocks on the daemon's health_status events instead of polling. Returns
+    None when the container has no healthcheck to wait on.
+    """
+    # Replay events from before the status check so none are missed
+    since = str(int(time.time()))
+    status = container_health(container)
+    if status is None:
+        return None
+    if status == "healthy":
+        return True
+
+    until = str(int(time.time() + timeout))
+    try:
+        with subprocess.Popen(
+                ["docker", "events",
+                 "--filter", f"container={container}",
+                 "--filter", "event=health_status",
+                 "--since", since, "--until", until,
+                 "--format", "{{.Status}}"],
+                stdout=subprocess.PIPE, text=True) as proc:
+            for line in proc.stdout:
+                if line.strip() == "health_status: healthy":
+                    proc.terminate()
+                    return True
+    except FileNotFoundError:
+        return None
+
+    return container_health(container) == "healthy"
+
+
 def start_database():
     """Start the PostgreSQL database using Docker Compose."""
     if not check_docker():
@@ -48,29 +176,20 @@ def start_database():
     print("🚀 Starting PostgreSQL database with Docker...")
 
     # Start the database
-    if not run_command("docker-compose up -d postgres", "Starting PostgreSQL container"):
+    if not run_command(["docker-compose", "up", "-d", "postgres"], "Starting PostgreSQL container"):
         return False
 
     # Wait for database to be ready
     print("⏳ Waiting for database to be ready...")
-    max_attempts = 30
-    for attempt in range(max_attempts):
-        try:
-            subprocess.run(
-                ["docker-compose", "exec", "-T", "postgres", "pg_isready",
-                    "-U", "chatbot_user", "-d", "ai_chatbot"],
-                check=True, capture_output=True
-            )
-            print("✅ Database is ready!")
-            break
-        except subprocess.CalledProcessError:
-            if attempt < max_attempts - 1:
-                print(
-                    f"⏳ Attempt {attempt + 1}/{max_attempts} - Database not ready yet, waiting...")
-                time.sleep(2)
-            else:
-                print("❌ Database failed to start within expected time")
-                return False
+    ready = wait_for_healthy(POSTGRES_CONTAINER)
+    if ready is None:
+        # No healthcheck to wait on; probe the server directly
+        ready = wait_for_postgres()
+
+    if not ready:
+        print("❌ Database failed to start within expected time")
+        return False
+    print("✅ Database is ready!")
 
     print("\n📊 Database Information:")
     print("Host: localhost")
@@ -89,7 +208,7 @@ def start_with_pgadmin():
 
     print("🚀 Starting PostgreSQL database with pgAdmin...")
 
-    if not run_command("docker-compose up -d", "Starting PostgreSQL and pgAdmin containers"):
+    if not run_command(["docker-compose", "up", "-d"], "Starting PostgreSQL and pgAdmin containers"):
         return False
 
     print("\n📊 Services Information:")
@@ -109,7 +228,7 @@ def start_with_pgadmin():
 
 def stop_database():
     """Stop the PostgreSQL database containers."""
-    return run_command("docker-compose down", "Stopping database containers")
+    return run_command(["docker-compose", "down"], "Stopping database containers")
 
 
 def restart_database():
@@ -123,13 +242,13 @@ def restart_database():
 def show_status():
     """Show the status of database containers."""
     print("📊 Container Status:")
-    run_command("docker-compose ps", "Checking container status")
+    run_command(["docker-compose", "ps"], "Checking container status")
 
 
 def show_logs():
     """Show logs from the PostgreSQL container."""
     print("📋 PostgreSQL Logs:")
-    run_command("docker-compose logs postgres", "Fetching PostgreSQL logs")
+    stream_command(["docker-compose", "logs", "postgres"], "Fetching PostgreSQL logs")
 
 
 def reset_database():
@@ -140,7 +259,7 @@ def reset_database():
 
     if confirm == 'yes':
         print("🗑️  Resetting database...")
-        run_command("docker-compose down -v",
+        run_command(["docker-compose", "down", "-v"],
                     "Stopping containers and removing volumes")
         time.sleep(2)
         return start_database()
@@ -2,23 +2,46 @@
 Launch script for AI Chatbot application.
 This script provides an easy way to start the Streamlit application with Docker containers.
 """
+import atexit
+import functools
+import http.client
+import random
+import shutil
 import subprocess
 import sys
 import os
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
+from docker_db_manager import (
+    POSTGRES_CONTAINER,
+    POSTGRES_HOST,
+    POSTGRES_PORT,
+    postgres_accepting
+)
 
+CHROMADB_CONTAINER = "ai-chatbot-chromadb"
+CHROMADB_HOST = "localhost"
+CHROMADB_PORT = 8000
+CHROMADB_HEARTBEAT_PATHS = ("/api/v2/heartbeat", "/api/v1/heartbeat")
+CONTAINER_STATUS_TTL = 5.0
+
+
+@functools.lru_cache(maxsize=1)
 def check_docker():
-    """Check if Docker is installed and running."""
+    """Check if Docker is installed and running (once per launcher run)."""
     print("🐳 Checking Docker installation...")
-    try:
-        # Check if Docker is installed
-        subprocess.run(["docker", "--version"], check=True,
-                       capture_output=True, text=True)
+    if shutil.which("docker") is None:
+        print("❌ Docker is not installed!")
+        print("Please install Docker and make sure it's running.")
+        return False
 
-        # Check if Docker is running
+    try:
+        # A missing binary raises FileNotFoundError and a stopped daemon
+        # exits non-zero, so one `docker info` covers both checks
         subprocess.run(["docker", "info"], check=True,
-                       capture_output=True, text=True)
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
 
         print("✅ Docker is installed and running!")
         return True
@@ -28,19 +51,172 @@ def check_docker():
         return False
 
 
-def check_containers_running():
-    """Check if required containers are already running."""
-    try:
-        result = subprocess.run(["docker", "ps", "--format", "table {{.Names}}"],
-                                capture_output=True, text=True, check=True)
-        running_containers = result.stdout
+class ContainerStatusCache:
+    """Short-lived cache of which app containers are running.
+
+    Entries expire after CONTAINER_STATUS_TTL seconds, and a background
+    `docker events` listener drops the cache as soon as one of our
+    containers starts, stops or dies. close() stops the listener and its
+    `docker events` child.
+    """
+
+    def __init__(self, ttl=CONTAINER_STATUS_TTL):
+        self._ttl = ttl
+        self._state = None
+        self._expires = 0.0
+        self._lock = threading.Lock()
+        self._listener = None
+        self._proc = None
+
+    def get(self):
+        """Return (postgres_running, chromadb_running), querying Docker on a miss."""
+        self._start_listener()
+        with self._lock:
+            if self._state is not None and time.monotonic() < self._expires:
+                return self._state
+
+        state = self._query()
+        with self._lock:
+            self._state = state
+            self._expires = time.monotonic() + self._ttl
+        return state
+
+    def invalidate(self):
+        """Forget the cached state so the next get() asks Docker again."""
+        with self._lock:
+            self._state = None
+
+    def close(self):
+        """Stop the event listener and reap its `docker events` process."""
+        with self._lock:
+            proc, self._proc = self._proc, None
+            self._listener = None
+            self._state = None
+        if proc is None:
+            return
+        proc.terminate()
+        try:
+            proc.wait(timeout=2)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            proc.wait()
+
+    @staticmethod
+    def _query():
+        try:
+            # Let the daemon filter to exact names (multiple name filters are OR'd)
+            result = subprocess.run([
+                "docker", "ps",
+                "--filter", f"name=^{POSTGRES_CONTAINER}$",
+                "--filter", f"name=^{CHROMADB_CONTAINER}$",
+                "--format", "{{.Names}}"
+            ], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                text=True, check=True)
+        except (subprocess.CalledProcessError, FileNotFoundError):
+            return False, False
+        running_containers = set(result.stdout.split())
+        return (POSTGRES_CONTAINER in running_containers,
+                CHROMADB_CONTAINER in running_containers)
+
+    def _start_listener(self):
+        with self._lock:
+            if self._listener is not None:
+                return
+            self._listener = threading.Thread(target=self._listen, daemon=True)
+        self._listener.start()
+
+    def _listen(self):
+        try:
+            proc = subprocess.Popen([
+                "docker", "events",
+                "--filter", "type=container",
+                "--filter", f"container={POSTGRES_CONTAINER}",
+                "--filter", f"container={CHROMADB_CONTAINER}",
+                "--filter", "event=start",
+                "--filter", "event=stop",
+                "--filter", "event=die",
+                "--format", "{{.Actor.Attributes.name}}"
+            ], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+        except OSError:
+            # No event stream; the TTL alone keeps the cache fresh
+            return
+        with self._lock:
+            closed = self._listener is not threading.current_thread()
+            if not closed:
+                self._proc = proc
+        if closed:
+            # close() ran while the process was starting
+            proc.terminate()
+            proc.wait()
+            return
+        for _ in proc.stdout:
+            self.invalidate()
 
-        postgres_running = "ai-chatbot-postgres" in running_containers
-        chromadb_running = "ai-chatbot-chromadb" in running_containers
 
-        return postgres_running, chromadb_running
-    except subprocess.CalledProcessError:
-        return False, False
+_container_status = ContainerStatusCache()
+# Don't leave `docker events` running after the launcher exits
+atexit.register(_container_status.close)
+
+
+@functools.lru_cache(maxsize=1)
+def compose_command():
+    """Return the argv prefix for Docker Compose, or None if it is missing."""
+    # Prefer the standalone v1 binary, else the `docker compose` v2 plugin
+    if shutil.which("docker-compose") is not None:
+        return ("docker-compose",)
+    if shutil.which("docker") is not None:
+        return ("docker", "compose")
+    return None
+
+
+def check_containers_running():
+    """Check if required containers are already running."""
+    return _container_status.get()
+
+
+def wait_with_backoff(check, timeout, initial_delay=0.1, max_delay=2.0):
+    """Call check() until it passes or the time budget runs out.
+
+    Sleeps grow exponentially (with +/-10% jitter) from initial_delay up to
+    max_delay, so fast starts are seen quickly and slow ones are not spammed.
+    """
+    deadline = time.monotonic() + timeout
+    delay = initial_delay
+    while True:
+        if check():
+            return True
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return False
+        time.sleep(min(delay * (1 + random.uniform(-0.1, 0.1)), remaining))
+        delay = min(delay * 2, max_delay)
+
+
+def wait_for_service(name, probe, timeout):
+    """Wait for one service to pass its probe; returns (name, ready)."""
+    return name, wait_with_backoff(probe, timeout)
+
+
+def postgres_ready():
+    """Return True if PostgreSQL answers on its published port."""
+    return postgres_accepting(POSTGRES_HOST, POSTGRES_PORT)
+
+
+def chromadb_ready():
+    """Return True if the ChromaDB heartbeat endpoint responds."""
+    # Chroma 1.x serves the v2 API only; older images still answer on v1
+    for path in CHROMADB_HEARTBEAT_PATHS:
+        conn = http.client.HTTPConnection(CHROMADB_HOST, CHROMADB_PORT, timeout=2)
+        try:
+            conn.request("GET", path)
+            if conn.getresponse().status == 200:
+                return True
+        except (OSError, http.client.HTTPException):
+            # Try the next path; a down server fails them all quickly
+            continue
+        finally:
+            conn.close()
+    return False
 
 
 def start_docker_containers():
@@ -51,57 +227,47 @@ def start_docker_containers():
         print("❌ docker-compose.yml not found!")
         return False
 
+    compose = compose_command()
+    if compose is None:
+        print("❌ docker-compose command not found!")
+        print("Please install Docker Compose.")
+        return False
+
     try:
-        # Start containers in detached mode
-        subprocess.run(["docker-compose", "up", "-d"], check=True)
+        # Compose v2 can block until every healthcheck passes, which leaves
+        # the waiting to the daemon instead of polling from here
+        print("⏳ Waiting for PostgreSQL and ChromaDB...")
+        waited = subprocess.run(
+            [*compose, "up", "-d", "--wait", "--wait-timeout", "60"])
+        if waited.returncode == 0:
+            _container_status.invalidate()
+            print("✅ Docker containers started and healthy!")
+            return True
+
+        # Older Compose has no --wait (or a service is still unhealthy);
+        # start in detached mode and probe the services ourselves
+        subprocess.run([*compose, "up", "-d"], check=True)
+        _container_status.invalidate()
         print("✅ Docker containers started successfully!")
 
-        # Wait for containers to be ready
-        print("⏳ Waiting for containers to be ready...")
-        time.sleep(5)
-
-        # Check PostgreSQL health
-        max_retries = 30
-        for i in range(max_retries):
-            try:
-                result = subprocess.run([
-                    "docker", "exec", "ai-chatbot-postgres",
-                    "pg_isready", "-U", "chatbot_user", "-d", "ai_chatbot"
-                ], capture_output=True, text=True, timeout=10, check=False)
-
-                if result.returncode == 0:
-                    print("✅ PostgreSQL is ready!")
-                    break
-
-            except (subprocess.CalledProcessError, subprocess.TimeoutExpired):
-                pass
-
-            if i < max_retries - 1:
-                print(f"⏳ Waiting for PostgreSQL... ({i+1}/{max_retries})")
-                time.sleep(2)
-        else:
-            print("⚠️ PostgreSQL might not be fully ready, but continuing...")
-
-        # Check ChromaDB health
-        for i in range(10):
-            try:
-                result = subprocess.run([
-                    "docker", "exec", "ai-chatbot-chromadb",
-                    "curl", "-f", "http://localhost:8000/api/v1/heartbeat"
-                ], capture_output=True, text=True, timeout=10, check=False)
-
-                if result.returncode == 0:
+        # Both services warm up in parallel, so probe them concurrently and
+        # report as each finishes
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            futures = [
+                executor.submit(wait_for_service, "postgres", postgres_ready, 60),
+                executor.submit(wait_for_service, "chromadb", chromadb_ready, 20),
+            ]
+            for future in as_completed(futures):
+                name, ready = future.result()
+                if name == "postgres":
+                    if ready:
+                        print("✅ PostgreSQL is ready!")
+                    else:
+                        print("⚠️ PostgreSQL might not be fully ready, but continuing...")
+                elif ready:
                     print("✅ ChromaDB is ready!")
-                    break
-
-            except (subprocess.CalledProcessError, subprocess.TimeoutExpired):
-                pass
-
-            if i < 9:
-                print(f"⏳ Waiting for ChromaDB... ({i+1}/10)")
-                time.sleep(2)
-        else:
-            print("✅ ChromaDB containers started (health check skipped)")
+                else:
+                    print("✅ ChromaDB containers started (health check skipped)")
 
         return True
 
@@ -117,8 +283,14 @@ def start_docker_containers():
 def stop_docker_containers():
     """Stop Docker containers."""
     print("🛑 Stopping Docker containers...")
+    compose = compose_command()
+    if compose is None:
+        print("❌ docker-compose command not found!")
+        return False
+
     try:
-        subprocess.run(["docker-compose", "down"], check=True)
+        subprocess.run([*compose, "down"], check=True)
+        _container_status.invalidate()
         print("✅ Docker containers stopped successfully!")
         return True
     except subprocess.CalledProcessError as e:
@@ -157,6 +329,8 @@ def install_dependencies():
 def launch_app():
     """Launch the Streamlit application."""
     print("🚀 Launching AI Chatbot...")
+    # Container status is not read again while Streamlit runs
+    _container_status.close()
     try:
         subprocess.run([sys.executable, "-m", "streamlit",
                        "run", "app.py"], check=True)
@@ -2,11 +2,16 @@
 Chat engine for the AI Chatbot application.
 Handles message routing, conversation management, and response generation.
 """
+import hashlib
+import re
+import time
+from collections import deque
 from datetime import datetime
-from typing import Any, Dict, List, Optional
+from itertools import islice
+from typing import Any, Deque, Dict, Generator, Optional
 
+import pandas as pd
 import streamlit as st
-from llama_index.llms.openai import OpenAI
 
 from config.settings import settings
 from src.database_handler import DatabaseHandler
@@ -14,6 +19,52 @@ from src.document_handler import DocumentHandler
 from src.token_tracker import token_tracker, create_usage_display
 
 
+# Query classification: single words are matched against the message's
+# words; multi-word phrases are compiled into one alternation per category
+# so each message is scanned once. Matching is case-insensitive, so only the
+# extracted words are lowercased rather than a copy of the whole message
+_WORD_RE = re.compile(r"[a-z0-9]+", re.IGNORECASE)
+
+_DATABASE_KEYWORDS = frozenset({
+    # Database-related keywords
+    "database", "table", "tables", "sql", "query", "select", "from", "where",
+    "join", "count", "sum", "average", "data", "records", "rows",
+    "columns", "schema", "postgres", "postgresql",
+    # Product/data query keywords - these should go to database
+    "find", "get", "list", "display",
+    "product", "products", "item", "items", "inventory", "stock", "price", "cost",
+    "category", "categories", "electronics",
+    "furniture", "coffee", "mug", "pen", "desk", "chair",
+    "what", "which", "all", "orders", "order",
+    "sales", "customers", "customer", "purchases", "transactions",
+    "today", "yesterday", "revenue",
+    "total", "placed", "bought", "sold"
+})
+_DATABASE_PHRASES = re.compile("|".join(map(re.escape, (
+    "show me", "search for", "office supplies", "how many",
+    "last month", "this month"
+))), re.IGNORECASE)
+
+_DOC_KEYWORDS = frozenset({
+    "document", "documents", "file", "files", "pdf", "text", "uploaded", "content"
+})
+_DOC_PHRASES = re.compile("|".join(map(re.escape, (
+    "what does the document say", "in the file", "according to"
+))), re.IGNORECASE)
+
+# Yields response text as it is produced; the final result dict is returned
+ResponseStream = Generator[str, None, Dict[str, Any]]
+
+
+def _drain(stream: ResponseStream) -> Dict[str, Any]:
+    """Exhaust a response stream and return its final result."""
+    while True:
+        try:
+            next(stream)
+        except StopIteration as stop:
+            return stop.value
+
+
 class ChatEngine:
     """Manages chat interactions and response routing."""
 
@@ -21,12 +72,15 @@ class ChatEngine:
         """Initialize the chat engine."""
         self.document_handler = document_handler
         self.database_handler = database_handler
+        # Cached LLM client and the (model, temperature) it was built for
+        self._llm = None
+        self._llm_key = None
         self.initialize_session_state()
 
     def initialize_session_state(self):
         """Initialize chat-related session state variables."""
         if "messages" not in st.session_state:
-            st.session_state.messages = []
+            st.session_state.messages = deque(maxlen=settings.MAX_CHAT_HISTORY)
 
         if "conversation_history" not in st.session_state:
             st.session_state.conversation_history = []
@@ -37,68 +91,66 @@ class ChatEngine:
         if "model" not in st.session_state:
             st.session_state.model = settings.DEFAULT_MODEL
 
+        if "usage_totals" not in st.session_state:
+            st.session_state.usage_totals = self._empty_usage_totals()
+
+    @staticmethod
+    def _empty_usage_totals() -> Dict[str, Any]:
+        """Return zeroed session usage totals."""
+        return {"input_tokens": 0, "output_tokens": 0, "cost": 0.0}
+
+    def _accumulate_usage(self, token_usage: Optional[Dict[str, Any]]):
+        """Add a response's token usage to the running session totals."""
+        if not token_usage:
+            return
+
+        totals = st.session_state.usage_totals
+        totals["input_tokens"] += token_usage.get("input_tokens", 0)
+        totals["output_tokens"] += token_usage.get("output_tokens", 0)
+        totals["cost"] += token_usage.get("cost", 0.0)
+
     def add_message(self, role: str, content: str, metadata: Optional[Dict] = None):
         """Add a message to the conversation history."""
         message = {
             "role": role,
             "content": content,
-            "timestamp": datetime.now().isoformat(),
+            # Integer nanoseconds; only formatted when the chat is exported
+            "timestamp": time.time_ns(),
             "metadata": metadata or {}
         }
 
+        # The bounded deque drops the oldest message once the limit is reached
         st.session_state.messages.append(message)
 
-        # Maintain conversation history limit
-        if len(st.session_state.messages) > settings.MAX_CONVERSATION_HISTORY * 2:
-            # Remove oldest messages (keep pairs)
-            st.session_state.messages = st.session_state.messages[-settings.MAX_CONVERSATION_HISTORY * 2:]
-
-    def classify_query(self, user_message: str) -> str:
-        """Classify the user query to determine routing."""
-        user_message_lower = user_message.lower()
-
-        # Database-related keywords
-        db_keywords = [
-            "database", "table", "sql", "query", "select", "from", "where",
-            "join", "count", "sum", "average", "data", "records", "rows",
-            "columns", "schema", "postgres", "postgresql"
-        ]
-
-        # Product/data query keywords - these should go to database
-        product_keywords = [
-            "show me", "find", "search for", "get", "list", "display",
-            "products", "items", "inventory", "stock", "price", "cost",
-            "category", "categories", "office supplies", "electronics",
-            "furniture", "coffee", "mug", "pen", "desk", "chair",
-            "how many", "what", "which", "all", "orders", "order",
-            "sales", "customers", "customer", "purchases", "transactions",
-            "last month", "this month", "today", "yesterday", "revenue",
-            "total", "count", "placed", "bought", "sold"
-        ]
-
-        # Document-related keywords
-        doc_keywords = [
-            "document", "file", "pdf", "text", "uploaded", "content",
-            "what does the document say", "in the file", "according to"
-        ]
-
-        # Check for database-related query (direct database keywords)
-        if any(keyword in user_message_lower for keyword in db_keywords):
-            if self.database_handler.get_connection_status():
-                return "database"
-
-        # Check for product/data queries that should go to database
-        if any(keyword in user_message_lower for keyword in product_keywords):
-            if self.database_handler.get_connection_status():
+    def classify_query(self, user_message: str,
+                       has_documents: Optional[bool] = None,
+                       db_connected: Optional[bool] = None) -> str:
+        """Classify the user query to determine routing.
+
+        Callers that already know the document and database state for this
+        turn can pass it in; otherwise it is looked up here.
+        """
+        if has_documents is None:
+            has_documents = bool(self.document_handler.get_uploaded_files())
+        if db_connected is None:
+            db_connected = self.database_handler.get_connection_status()
+
+        words = {word.lower() for word in _WORD_RE.findall(user_message)}
+
+        # Database and product/data queries go to the database when connected
+        if (not words.isdisjoint(_DATABASE_KEYWORDS)
+                or _DATABASE_PHRASES.search(user_message)):
+            if db_connected:
                 return "database"
 
         # Check for document-related query
-        if any(keyword in user_message_lower for keyword in doc_keywords):
-            if self.document_handler.get_uploaded_files():
+        if (not words.isdisjoint(_DOC_KEYWORDS)
+                or _DOC_PHRASES.search(user_message)):
+            if has_documents:
                 return "document"
 
         # Check if we have uploaded documents and the query might be about them
-        if self.document_handler.get_uploaded_files() and len(user_message.split()) > 3:
+        if has_documents and len(user_message.split()) > 3:
             return "document"
 
         # Default to general chat
@@ -106,19 +158,34 @@ class ChatEngine:
 
     def process_document_query(self, user_message: str) -> Dict[str, Any]:
         """Process query against uploaded documents."""
+        return _drain(self._stream_document_query(user_message))
+
+    def _stream_document_query(self, user_message: str) -> ResponseStream:
+        """Stream an answer from the uploaded documents as it is synthesized."""
         try:
-            query_engine = self.document_handler.get_query_engine()
+            query_engine = self.document_handler.get_query_engine(streaming=True)
 
             if query_engine is None:
-                return {
+                result = {
                     "response": "No documents are currently uploaded. Please upload some documents first.",
                     "sources": [],
                     "type": "error"
                 }
+                yield result["response"]
+                return result
 
-            # Query the documents
+            # Query the documents, passing text on as it is synthesized
             response = query_engine.query(user_message)
-            response_text = str(response)
+            response_gen = getattr(response, 'response_gen', None)
+            if response_gen is None:
+                response_text = str(response)
+                yield response_text
+            else:
+                chunks = []
+                for delta in response_gen:
+                    chunks.append(delta)
+                    yield delta
+                response_text = "".join(chunks)
 
             # Track token usage (estimate for document queries)
             # Note: LlamaIndex doesn't expose detailed token usage, so we estimate
@@ -149,60 +216,98 @@ class ChatEngine:
             }
 
         except AttributeError as e:
-            return {
-                "response": f"Error processing document query (attribute error): {str(e)}",
-                "sources": [],
-                "type": "error"
-            }
+            error_text = f"Error processing document query (attribute error): {str(e)}"
         except RuntimeError as e:
-            return {
-                "response": f"Runtime error processing document query: {str(e)}",
-                "sources": [],
-                "type": "error"
-            }
+            error_text = f"Runtime error processing document query: {str(e)}"
         except ValueError as e:
-            return {
-                "response": f"Value error processing document query: {str(e)}",
-                "sources": [],
-                "type": "error"
-            }
+            error_text = f"Value error processing document query: {str(e)}"
+
+        yield error_text
+        return {
+            "response": error_text,
+            "sources": [],
+            "type": "error"
+        }
 
     def process_database_query(self, user_message: str) -> Dict[str, Any]:
         """Process query against connected database."""
+        return _drain(self._stream_database_query(user_message))
+
+    def _stream_database_query(self, user_message: str) -> ResponseStream:
+        """Answer from the connected database.
+
+        Result summaries are yielded whole; when no SQL can be recovered the
+        synthesized answer is streamed as it is generated.
+        """
         try:
             if not self.database_handler.get_connection_status():
-                return {
+                result = {
                     "response": "No database connection. Please connect to a database first.",
                     "sql_query": None,
                     "data": None,
                     "type": "error"
                 }
+                yield result["response"]
+                return result
 
             # Convert natural language to SQL and execute
             result = self.database_handler.natural_language_to_sql(
                 user_message)
 
             if result is None:
-                return {
+                result = {
                     "response": "Failed to process the database query. Please try rephrasing your question.",
                     "sql_query": None,
                     "data": None,
                     "type": "error"
                 }
+                yield result["response"]
+                return result
 
             sql_query, data = result
 
-            if data is None or data.empty:
+            # No SQL could be recovered; the answer comes back as text
+            if data is not None and not isinstance(data, pd.DataFrame):
+                if isinstance(data, str):
+                    response_text = data
+                    yield response_text
+                else:
+                    chunks = []
+                    for delta in data:
+                        chunks.append(delta)
+                        yield delta
+                    response_text = "".join(chunks)
+
+                model = st.session_state.get('model', settings.DEFAULT_MODEL)
+                request_info = token_tracker.track_request(
+                    input_text=user_message,
+                    output_text=response_text,
+                    model=model,
+                    request_type="database_query"
+                )
                 return {
+                    "response": response_text,
+                    "sql_query": None,
+                    "data": None,
+                    "type": "database",
+                    "query": user_message,
+                    "token_usage": request_info
+                }
+
+            if data is None or data.empty:
+                result = {
                     "response": "The query executed successfully but returned no results.",
                     "sql_query": sql_query,
                     "data": None,
                     "type": "database"
                 }
+                yield result["response"]
+                return result
 
             # Generate natural language response
             response_text = self._generate_database_response(
                 user_message, data, sql_query)
+            yield response_text
 
             # Track token usage for database queries (estimate)
             # Note: Database queries involve SQL generation via LlamaIndex
@@ -218,73 +323,82 @@ class ChatEngine:
                 "response": response_text,
                 "sql_query": sql_query,
                 "data": data,
+                "data_hash": self._hash_dataframe(data),
+                "csv_filename": f"query_results_{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}.csv",
                 "type": "database",
                 "query": user_message,
                 "token_usage": request_info
             }
 
         except ValueError as e:
-            return {
-                "response": f"Value error processing database query: {str(e)}",
-                "sql_query": None,
-                "data": None,
-                "type": "error"
-            }
+            error_text = f"Value error processing database query: {str(e)}"
         except TypeError as e:
-            return {
-                "response": f"Type error processing database query: {str(e)}",
-                "sql_query": None,
-                "data": None,
-                "type": "error"
-            }
+            error_text = f"Type error processing database query: {str(e)}"
         except AttributeError as e:
-            return {
-                "response": f"Attribute error processing database query: {str(e)}",
-                "sql_query": None,
-                "data": None,
-                "type": "error"
-            }
+            error_text = f"Attribute error processing database query: {str(e)}"
+
+        yield error_text
+        return {
+            "response": error_text,
+            "sql_query": None,
+            "data": None,
+            "type": "error"
+        }
 
     def process_general_query(self, user_message: str) -> Dict[str, Any]:
         """Process general chat query using OpenAI."""
-        try:
-            # Create OpenAI client
-            llm = OpenAI(
-                model=st.session_state.model,
-                temperature=st.session_state.temperature,
+        return _drain(self._stream_general_query(user_message))
+
+    def _get_llm(self, model: str, temperature: float):
+        """Return the OpenAI client, rebuilding it only when settings change."""
+        key = (model, temperature)
+        if self._llm is None or key != self._llm_key:
+            # Imported here so the OpenAI client loads on the first general query
+            from llama_index.llms.openai import OpenAI
+
+            self._llm = OpenAI(
+                model=model,
+                temperature=temperature,
                 api_key=settings.OPENAI_API_KEY
             )
+            self._llm_key = key
+        return self._llm
+
+    def _stream_general_query(self, user_message: str) -> ResponseStream:
+        """Stream a general chat reply from OpenAI as tokens arrive."""
+        try:
+            # Reuse the OpenAI client while model and temperature are unchanged
+            llm = self._get_llm(st.session_state.model, st.session_state.temperature)
 
-            # Prepare conversation context
-            messages = []
+            from llama_index.core.llms import ChatMessage
 
             # Add system message
             system_message = """You are a helpful AI assistant. You can help users with general questions,
             but you specialize in helping them work with documents and databases. If users ask about 
             documents or databases, suggest they upload documents or connect to a database first."""
 
-            messages.append({"role": "system", "content": system_message})
-
-            # Add recent conversation history
-            # Last 10 messages
-            recent_messages = st.session_state.messages[-10:]
-            for msg in recent_messages:
+            # Prepare conversation context: system prompt plus the last 10
+            # messages, which already end with the current user message
+            messages = [ChatMessage(role="system", content=system_message)]
+            input_parts = [system_message]
+            history = st.session_state.messages
+            start = max(0, len(history) - 10)
+            for msg in islice(history, start, None):
                 if msg["role"] in ["user", "assistant"]:
                     messages.append(
-                        {"role": msg["role"], "content": msg["content"]})
-
-            # Add current message
-            messages.append({"role": "user", "content": user_message})
+                        ChatMessage(role=msg["role"], content=msg["content"]))
+                    input_parts.append(msg["content"])
 
             # Prepare input text for token counting
-            input_text = system_message + "\n" + user_message
-            for msg in recent_messages:
-                if msg["role"] in ["user", "assistant"]:
-                    input_text += f"\n{msg['content']}"
+            input_text = "\n".join(input_parts)
 
-            # Generate response
-            response = llm.complete(user_message)
-            response_text = str(response)
+            # Generate response, passing text on as it arrives
+            chunks = []
+            for partial in llm.stream_chat(messages):
+                if partial.delta:
+                    chunks.append(partial.delta)
+                    yield partial.delta
+            response_text = "".join(chunks)
 
             # Track token usage
             request_info = token_tracker.track_request(
@@ -302,11 +416,30 @@ class ChatEngine:
             }
 
         except (AttributeError, ValueError, TypeError) as e:
+            error_text = f"Error processing general query: {str(e)}"
+            yield error_text
             return {
-                "response": f"Error processing general query: {str(e)}",
+                "response": error_text,
                 "type": "error"
             }
 
+    @staticmethod
+    def _hash_dataframe(data: pd.DataFrame) -> str:
+        """Compute a stable content hash for query results.
+
+        Covers column names, dtypes, shape and the per-row hashes in order,
+        so reordered rows or renamed columns give a different digest.
+        """
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(repr((list(data.columns), [str(dtype) for dtype in data.dtypes],
+                            data.shape)).encode("utf-8"))
+        try:
+            digest.update(pd.util.hash_pandas_object(data, index=True).values.tobytes())
+        except TypeError:
+            # Unhashable cell values (lists, dicts) - fall back to the text form
+            digest.update(data.to_csv().encode("utf-8"))
+        return digest.hexdigest()
+
     def _generate_database_response(self, question: str, data, sql_query: str | None) -> str:
         """Generate natural language response for database query results."""
         try:
@@ -314,64 +447,72 @@ class ChatEngine:
                 return "The query executed successfully but returned no results."
 
             # Basic response generation
-            num_rows = len(data)
-            num_cols = len(data.columns)
-
-            response_parts = []
+            num_rows, num_cols = data.shape
 
             # Add basic info about results
             if num_rows == 1:
-                response_parts.append(
-                    f"I found 1 record with {num_cols} columns.")
+                summary = f"I found 1 record with {num_cols} columns."
             else:
-                response_parts.append(
-                    f"I found {num_rows} records with {num_cols} columns.")
+                summary = f"I found {num_rows} records with {num_cols} columns."
 
             # Add sample of data if not too large
             if num_rows <= 10 and num_cols <= 5:
-                response_parts.append("\nHere are the results:")
                 # This will be displayed as a table in the UI
-            elif num_rows > 10:
-                response_parts.append(
-                    f"\nShowing first 10 out of {num_rows} records:")
-
-            return " ".join(response_parts)
+                return f"{summary} \nHere are the results:"
+            if num_rows > 10:
+                return f"{summary} \nShowing first 10 out of {num_rows} records:"
+            return summary
 
         except (AttributeError, TypeError, ValueError) as e:
             return f"Error generating database response: {str(e)}"
 
     def process_message(self, user_message: str) -> Dict[str, Any]:
         """Main method to process user messages."""
+        return _drain(self.stream_message(user_message))
+
+    def stream_message(self, user_message: str) -> ResponseStream:
+        """Process a user message, yielding the response text as it is produced.
+
+        General chat and document answers are streamed as they are generated;
+        database result summaries are yielded whole. The full result is the
+        return value.
+        """
         if not user_message.strip():
-            return {
+            result = {
                 "response": "Please enter a message.",
                 "type": "error"
             }
+            yield result["response"]
+            return result
 
         # Add user message to history
         self.add_message("user", user_message)
 
-        # Classify and route the query
-        query_type = self.classify_query(user_message)
+        # Look up backend state once for this turn, then classify and route
+        has_documents = bool(self.document_handler.get_uploaded_files())
+        db_connected = self.database_handler.get_connection_status()
+        query_type = self.classify_query(user_message, has_documents, db_connected)
 
         if query_type == "document":
-            result = self.process_document_query(user_message)
+            result = yield from self._stream_document_query(user_message)
         elif query_type == "database":
-            result = self.process_database_query(user_message)
+            result = yield from self._stream_database_query(user_message)
         else:
-            result = self.process_general_query(user_message)
+            result = yield from self._stream_general_query(user_message)
 
         # Add assistant response to history
         self.add_message("assistant", result["response"], result)
+        self._accumulate_usage(result.get("token_usage"))
 
         return result
 
     def clear_conversation(self):
         """Clear the conversation history."""
-        st.session_state.messages = []
+        st.session_state.messages = deque(maxlen=settings.MAX_CHAT_HISTORY)
         st.session_state.conversation_history = []
+        st.session_state.usage_totals = self._empty_usage_totals()
 
-    def get_conversation_history(self) -> List[Dict]:
+    def get_conversation_history(self) -> Deque[Dict]:
         """Get the current conversation history."""
         return st.session_state.messages
 
@@ -380,14 +521,18 @@ class ChatEngine:
         if not st.session_state.messages:
             return "No conversation to export."
 
-        export_text = f"Chat Export - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n"
-        export_text += "=" * 50 + "\n\n"
+        parts = [
+            f"Chat Export - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n",
+            "=" * 50 + "\n\n",
+        ]
 
         for message in st.session_state.messages:
             timestamp = message.get("timestamp", "")
+            if isinstance(timestamp, int):
+                timestamp = datetime.fromtimestamp(timestamp / 1e9).isoformat()
             role = message["role"].title()
             content = message["content"]
 
-            export_text += f"[{timestamp}] {role}:\n{content}\n\n"
+            parts.append(f"[{timestamp}] {role}:\n{content}\n\n")
 
-        return export_text
+        return "".join(parts)
@@ -2,15 +2,253 @@
 Database handling functionality for the AI Chatbot.
 Handles PostgreSQL connections and SQL query processing using LlamaIndex.
 """
-from typing import List, Optional, Dict, Any, Tuple
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import List, Optional, Dict, Any, Iterator, Tuple, Union
 import streamlit as st
 import pandas as pd
-from sqlalchemy import create_engine, text, inspect
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import URL, make_url
 from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.pool import NullPool
 from llama_index.core.query_engine import NLSQLTableQueryEngine
 from llama_index.core import SQLDatabase
+from config.settings import settings
 from src.utils import validate_connection_string
 
+try:
+    import sqlglot  # type: ignore
+    from sqlglot import exp  # type: ignore
+    from sqlglot.errors import SqlglotError  # type: ignore
+except ImportError:
+    sqlglot = None
+
+
+# Rows fetched per round trip when streaming query results
+SQL_FETCH_CHUNK_SIZE = 10_000
+
+# Pooled engines kept for reuse; the least recently used one is disposed
+# when another database is connected past this
+ENGINE_CACHE_SIZE = 8
+
+# Columns of every user table, ordered for grouping by table. Reads the
+# catalogs directly; the information_schema views join far more than this
+_TABLE_COLUMNS_QUERY = text("""
+    SELECT n.nspname, c.relname, a.attname,
+           format_type(a.atttypid, a.atttypmod),
+           NOT a.attnotnull,
+           pg_get_expr(d.adbin, d.adrelid)
+    FROM pg_class c
+    JOIN pg_namespace n ON n.oid = c.relnamespace
+    LEFT JOIN pg_attribute a
+        ON a.attrelid = c.oid AND a.attnum > 0 AND NOT a.attisdropped
+    LEFT JOIN pg_attrdef d ON d.adrelid = c.oid AND d.adnum = a.attnum
+    WHERE c.relkind IN ('r', 'p')
+      AND n.nspname <> 'information_schema'
+      AND n.nspname NOT LIKE 'pg\\_%'
+      AND has_table_privilege(c.oid, 'SELECT')
+    ORDER BY n.nspname, c.relname, a.attnum
+""")
+
+# SELECT privilege for a batch of (schema, table) pairs in one round trip
+_TABLE_PRIVILEGES_QUERY = text("""
+    SELECT t.schema_name, t.table_name, has_table_privilege(c.oid, 'SELECT')
+    FROM unnest(CAST(:schemas AS text[]), CAST(:tables AS text[]))
+        AS t(schema_name, table_name)
+    JOIN pg_namespace n ON n.nspname = t.schema_name
+    JOIN pg_class c ON c.relnamespace = n.oid AND c.relname = t.table_name
+""")
+
+# Product name fragments worth sampling when a question mentions them
+_PRODUCT_SEARCH_TERMS = ('lamp', 'light', 'desk', 'chair', 'computer',
+                         'phone', 'coffee', 'mug', 'table', 'monitor', 'keyboard')
+# One case-insensitive pass over the question finds every mentioned term
+_PRODUCT_SEARCH_RE = re.compile("|".join(map(re.escape, _PRODUCT_SEARCH_TERMS)), re.IGNORECASE)
+_PRODUCT_CATEGORIES_QUERY = text("SELECT DISTINCT category FROM products")
+# Up to five names per mentioned term in one round trip; terms are bound as
+# a text[] and unnested in order
+_PRODUCT_NAME_SAMPLES_QUERY = text("""
+    SELECT t.term, p.name
+    FROM unnest(CAST(:terms AS text[])) WITH ORDINALITY AS t(term, ord)
+    CROSS JOIN LATERAL (
+        SELECT name FROM products WHERE name ILIKE '%' || t.term || '%' LIMIT 5
+    ) p
+    ORDER BY t.ord
+""")
+
+
+def _enforce_limit(sql: str, cap: int) -> str:
+    """Add LIMIT cap to a query that has none, so the server stops early.
+
+    The query is rewritten with sqlglot; if sqlglot is missing or the query
+    does not parse, it is returned unchanged and only the fetch is capped.
+    """
+    if sqlglot is None:
+        return sql
+    try:
+        expression = sqlglot.parse_one(sql, read="postgres")
+    except SqlglotError:
+        return sql
+    if not hasattr(expression, "limit") or expression.args.get("limit") is not None:
+        return sql
+    return expression.limit(cap).sql(dialect="postgres")
+
+
+def _is_single_select(sql: str) -> bool:
+    """Return True if sql is exactly one SELECT statement.
+
+    Parsed with sqlglot, which also rejects a SELECT followed by further
+    statements. Without it, the query must start with SELECT and may only
+    contain a ';' at the end, even inside string literals.
+    """
+    if sqlglot is None:
+        body = sql.strip().rstrip(';').rstrip()
+        if ';' in body:
+            return False
+        # Compare the first six characters without uppercasing the whole query
+        return body[:6].upper() == 'SELECT'
+    try:
+        statements = [stmt for stmt in sqlglot.parse(sql, read="postgres") if stmt is not None]
+    except SqlglotError:
+        return False
+    return len(statements) == 1 and isinstance(statements[0], (exp.Select, exp.Union))
+
+
+def _fetch_row_chunks(result, chunksize: int, max_rows: Optional[int] = None):
+    """Yield lists of rows from a result, stopping once max_rows are read."""
+    remaining = max_rows
+    while remaining is None or remaining > 0:
+        size = chunksize if remaining is None else min(chunksize, remaining)
+        rows = result.fetchmany(size)
+        if not rows:
+            return
+        if remaining is not None:
+            remaining -= len(rows)
+        yield rows
+
+
+def _engine_cache_key(connection_url: str) -> str:
+    """Cache key for a connection URL that does not contain its password.
+
+    The URL is shown with the password masked, plus a digest of the full URL
+    so different credentials for the same database never share an engine.
+    """
+    digest = hashlib.blake2b(connection_url.encode("utf-8"), digest_size=16).hexdigest()
+    return f"{make_url(connection_url).render_as_string(hide_password=True)}#{digest}"
+
+
+# Engines by _engine_cache_key, least recently used first
+_engines: "OrderedDict[str, Any]" = OrderedDict()
+_engines_lock = threading.Lock()
+
+
+def _get_engine(connection_url: str):
+    """Pooled engine shared by every session connected to the same database."""
+    key = _engine_cache_key(connection_url)
+    with _engines_lock:
+        engine = _engines.get(key)
+        if engine is not None:
+            _engines.move_to_end(key)
+            return engine
+        engine = create_engine(
+            connection_url,
+            pool_size=settings.DB_POOL_SIZE,
+            max_overflow=settings.DB_MAX_OVERFLOW,
+            pool_timeout=settings.DB_POOL_TIMEOUT,
+            pool_pre_ping=settings.DB_POOL_PRE_PING,
+            pool_recycle=settings.DB_POOL_RECYCLE
+        )
+        _engines[key] = engine
+        if len(_engines) > ENGINE_CACHE_SIZE:
+            _, evicted = _engines.popitem(last=False)
+        else:
+            evicted = None
+    if evicted is not None:
+        # Closes its idle connections; a session still holding the engine
+        # gets a fresh pool on its next query
+        evicted.dispose()
+    return engine
+
+
+@st.cache_resource(show_spinner=False, max_entries=ENGINE_CACHE_SIZE)
+def _get_sql_database(engine_key: str, _engine) -> SQLDatabase:
+    """LlamaIndex wrapper for a database; building it reflects every table."""
+    return SQLDatabase(_engine)
+
+
+@contextmanager
+def _read_only_connection(engine, stream_results: bool = False):
+    """Connection whose transaction is read-only and time-limited.
+
+    Postgres refuses writes even if a query slips past validation, and a
+    runaway statement is cancelled instead of holding a pooled connection.
+    """
+    conn = engine.connect()
+    if stream_results:
+        conn = conn.execution_options(stream_results=True)
+    with conn:
+        conn.execute(text("SET TRANSACTION READ ONLY"))
+        conn.execute(text("SELECT set_config('statement_timeout', :timeout, true)"),
+                     {"timeout": str(settings.DB_STATEMENT_TIMEOUT_MS)})
+        yield conn
+
+
+# Fixed guidance for SQL generation, given to the query engine once rather
+# than appended to every question
+_PRODUCT_SQL_GUIDANCE = """Important: When searching for product types or items, search the 'name' column using ILIKE for partial matches, not the 'category' column. For example:
+- To find items with 'desk': SELECT * FROM products WHERE name ILIKE '%desk%'
+- To find items with 'lamp': SELECT * FROM products WHERE name ILIKE '%lamp%'
+- Categories are broad groups like 'Furniture', 'Electronics', 'Office Supplies'
+- Product names contain specific items like 'Desk Lamp', 'Standing Desk', 'Coffee Mug'"""
+
+
+@st.cache_data(ttl=60, show_spinner=False)
+def _read_table_preview(engine_key: str, _engine, query: str, limit: int) -> pd.DataFrame:
+    """Read the first chunk of a LIMITed preview query.
+
+    Keyed on the connection URL (password hidden) so sessions connected to
+    different databases never share previews.
+    """
+    # Server-side cursor so rows are streamed rather than buffered
+    with _read_only_connection(_engine, stream_results=True) as conn:
+        chunks = pd.read_sql(text(query), conn, params={"limit": limit}, chunksize=limit)
+        return next(iter(chunks), pd.DataFrame())
+
+
+@st.cache_data(ttl=300, show_spinner=False)
+def _read_table_columns(engine_key: str, _engine) -> List[Tuple]:
+    """Read every table's columns, cached per database for a few minutes."""
+    with _engine.connect() as conn:
+        return [tuple(row) for row in conn.execute(_TABLE_COLUMNS_QUERY)]
+
+
+@st.cache_data(ttl=300, show_spinner=False)
+def _read_product_categories(engine_key: str, _engine) -> List[str]:
+    """Read the distinct product categories, which rarely change."""
+    with _engine.connect() as conn:
+        return [row[0] for row in conn.execute(_PRODUCT_CATEGORIES_QUERY)]
+
+
+@st.cache_data(show_spinner=False)
+def _read_server_version(engine_key: str, _engine) -> str:
+    """Read the server version string; fixed for the life of the server."""
+    with _engine.connect() as conn:
+        row = conn.execute(text("SELECT version()")).fetchone()
+        return row[0] if row else "Unknown"
+
+
+@st.cache_data(ttl=60, show_spinner=False)
+def _read_database_size(engine_key: str, _engine) -> str:
+    """Read the current database size, refreshed at most once a minute."""
+    with _engine.connect() as conn:
+        row = conn.execute(
+            text("SELECT pg_size_pretty(pg_database_size(current_database()))")
+        ).fetchone()
+        return row[0] if row else "Unknown"
+
 
 class DatabaseHandler:
     """Handles database connections and query processing."""
@@ -19,45 +257,58 @@ class DatabaseHandler:
         """Initialize the database handler."""
         self.engine = None
         self.sql_database = None
+        self.query_engine = None
+        self.connection_url = None
         self.connection_status = False
         self.available_tables = []
         self.table_schemas = {}
 
-    def test_connection(self, connection_string: str) -> Tuple[bool, str]:
+    def test_connection(self, connection_string: Union[str, URL]) -> Tuple[bool, str]:
         """Test database connection."""
         try:
             if not validate_connection_string(connection_string):
                 return False, "Invalid connection string format"
 
-            # Test basic connection
-            engine = create_engine(connection_string)
-            with engine.connect() as conn:
-                conn.execute(text("SELECT 1"))
+            # Test basic connection; a one-off check needs no pool
+            engine = create_engine(connection_string, poolclass=NullPool)
+            try:
+                with engine.connect() as conn:
+                    conn.execute(text("SELECT 1"))
+            finally:
+                engine.dispose()
 
             return True, "Connection successful"
 
         except SQLAlchemyError as e:
             return False, f"Database connection error: {str(e)}"
 
-    def connect_to_database(self, connection_string: str) -> bool:
+    def connect_to_database(self, connection_string: Union[str, URL]) -> bool:
         """Connect to PostgreSQL database."""
         try:
             if not validate_connection_string(connection_string):
                 st.error("Invalid connection string format")
                 return False
 
-            # Create SQLAlchemy engine
-            self.engine = create_engine(connection_string)
+            # Reuse the cached engine (and its pool) for this database rather
+            # than building a new one on every connect
+            if isinstance(connection_string, URL):
+                connection_url = connection_string.render_as_string(hide_password=False)
+            else:
+                connection_url = connection_string
+            self.engine = _get_engine(connection_url)
+            self.connection_url = connection_url
 
             # Test connection
             with self.engine.connect() as conn:
                 conn.execute(text("SELECT 1"))
 
             # Create LlamaIndex SQL database
-            self.sql_database = SQLDatabase(self.engine)
+            self.sql_database = _get_sql_database(
+                _engine_cache_key(connection_url), self.engine)
 
             # Load table information
             self._load_table_information()
+            self.query_engine = self._build_query_engine()
 
             self.connection_status = True
             st.session_state.db_connected = True
@@ -72,11 +323,15 @@ class DatabaseHandler:
     def disconnect_from_database(self):
         """Disconnect from database."""
         try:
-            if self.engine:
+            # The engine is shared with other sessions on the same database.
+            # dispose() closes its idle connections; connections checked out
+            # elsewhere are left alone and the next query opens a fresh pool
+            if self.engine is not None:
                 self.engine.dispose()
-
             self.engine = None
             self.sql_database = None
+            self.query_engine = None
+            self.connection_url = None
             self.connection_status = False
             self.available_tables = []
             self.table_schemas = {}
@@ -88,7 +343,7 @@ class DatabaseHandler:
         except Exception as e:
             st.error(f"Error disconnecting from database: {str(e)}")
 
-    def _load_table_information(self):
+    def _load_table_information(self, use_cache: bool = True):
         """Load table and schema information."""
         try:
 
@@ -96,33 +351,37 @@ class DatabaseHandler:
                 st.error("No database connection available")
                 return
 
-            inspector = inspect(self.engine)
-
-            # Get all schemas
-            schemas = inspector.get_schema_names()
+            # One round trip for every table's columns instead of one per
+            # table; reconnecting to the same database reuses the result
+            if not use_cache:
+                _read_table_columns.clear()
+                _read_product_categories.clear()
+            rows = _read_table_columns(self._engine_key(), self.engine)
 
             self.available_tables = []
             self.table_schemas = {}
 
-            for schema in schemas:
-                # Skip system schemas
-                if schema in ['information_schema', 'pg_catalog', 'pg_toast']:
-                    continue
+            for schema, table, column, data_type, nullable, default in rows:
+                full_table_name = f"{schema}.{table}" if schema != 'public' else table
 
-                tables = inspector.get_table_names(schema=schema)
-
-                for table in tables:
-                    full_table_name = f"{schema}.{table}" if schema != 'public' else table
+                table_info = self.table_schemas.get(full_table_name)
+                if table_info is None:
                     self.available_tables.append(full_table_name)
-
-                    # Get column information
-                    columns = inspector.get_columns(table, schema=schema)
-                    self.table_schemas[full_table_name] = {
+                    table_info = self.table_schemas[full_table_name] = {
                         'schema': schema,
                         'table': table,
-                        'columns': columns
+                        'columns': []
                     }
 
+                # Tables without columns come back once with a NULL column
+                if column is not None:
+                    table_info['columns'].append({
+                        'name': column,
+                        'type': data_type,
+                        'nullable': nullable,
+                        'default': default
+                    })
+
             self.available_tables.sort()
 
         except Exception as e:
@@ -136,15 +395,29 @@ class DatabaseHandler:
         """Get schema information for a specific table."""
         return self.table_schemas.get(table_name)
 
+    def _engine_key(self) -> str:
+        """Cache key for the current database (connection URL, password hidden)."""
+        return self.engine.url.render_as_string(hide_password=True)
+
+    def _quoted_table_name(self, table_info: Dict) -> str:
+        """Quote a known table's identifiers rather than interpolating the raw name."""
+        quote = self.engine.dialect.identifier_preparer.quote
+        return f"{quote(table_info['schema'])}.{quote(table_info['table'])}"
+
     def get_table_preview(self, table_name: str, limit: int = 5) -> Optional[pd.DataFrame]:
         """Get a preview of table data."""
         try:
             if not self.engine:
                 return None
 
-            query = f"SELECT * FROM {table_name} LIMIT {limit}"
-            df = pd.read_sql(query, self.engine)
-            return df
+            table_info = self.table_schemas.get(table_name)
+            if table_info is None:
+                st.error(f"Unknown table: {table_name}")
+                return None
+
+            query = f"SELECT * FROM {self._quoted_table_name(table_info)} LIMIT :limit"
+
+            return _read_table_preview(self._engine_key(), self.engine, query, limit)
 
         except SQLAlchemyError as e:
             st.error(f"SQL execution error: {str(e)}")
@@ -154,8 +427,15 @@ class DatabaseHandler:
                 f"Value error while previewing table {table_name}: {str(e)}")
             return None
 
-    def execute_sql_query(self, query: str) -> Optional[pd.DataFrame]:
-        """Execute SQL query and return results."""
+    def execute_sql_query(self, query: str, chunksize: Optional[int] = None,
+                          max_rows: Optional[int] = None
+                          ) -> Optional[Union[pd.DataFrame, Iterator[pd.DataFrame]]]:
+        """Execute SQL query and return results.
+
+        With chunksize set, returns an iterator of DataFrames of at most that
+        many rows instead of one DataFrame (like pandas.read_sql). With
+        max_rows set, fetching stops once that many rows have been read.
+        """
         try:
             if not self.engine:
                 st.error("No database connection")
@@ -163,26 +443,82 @@ class DatabaseHandler:
 
             # Basic SQL injection protection
             query = query.strip()
-            if not query.upper().startswith('SELECT'):
-                st.error("Only SELECT queries are allowed")
+            if not _is_single_select(query):
+                st.error("Only single SELECT queries are allowed")
                 return None
 
-            # Use text() to wrap the query for SQLAlchemy 2.x compatibility
-            with self.engine.connect() as conn:
+            if chunksize is not None:
+                return self._iter_query_chunks(query, chunksize, max_rows)
+
+            # Stream rows from a server-side cursor and build the frame from
+            # chunks, so the driver never holds the whole result at once
+            with _read_only_connection(self.engine, stream_results=True) as conn:
+                # Use text() to wrap the query for SQLAlchemy 2.x compatibility
                 result = conn.execute(text(query))
-                rows = result.fetchall()
                 columns = list(result.keys())
+                chunks = [pd.DataFrame.from_records(rows, columns=columns)
+                          for rows in _fetch_row_chunks(result, SQL_FETCH_CHUNK_SIZE, max_rows)]
 
-                # Convert to DataFrame
-                df = pd.DataFrame(rows, columns=columns)
-                return df
+            if not chunks:
+                return pd.DataFrame(columns=columns)
+            if len(chunks) == 1:
+                return chunks[0]
+            return pd.concat(chunks, ignore_index=True)
 
         except SQLAlchemyError as e:
             st.error(f"SQL execution error: {str(e)}")
             return None
 
-    def natural_language_to_sql(self, question: str) -> Tuple[str | None, pd.DataFrame | None] | None:
-        """Convert natural language question to SQL and execute."""
+    def _iter_query_chunks(self, query: str, chunksize: int,
+                           max_rows: Optional[int] = None) -> Iterator[pd.DataFrame]:
+        """Yield query results as DataFrames of at most chunksize rows."""
+        try:
+            with _read_only_connection(self.engine, stream_results=True) as conn:
+                result = conn.execute(text(query))
+                columns = list(result.keys())
+                for rows in _fetch_row_chunks(result, chunksize, max_rows):
+                    yield pd.DataFrame.from_records(rows, columns=columns)
+        except SQLAlchemyError as e:
+            st.error(f"SQL execution error: {str(e)}")
+
+    def _build_query_engine(self) -> NLSQLTableQueryEngine:
+        """Create the NL-to-SQL engine over the currently known tables."""
+        # Streaming defers the answer synthesis until the text is read, so it
+        # is skipped whenever the SQL results are used instead
+        return NLSQLTableQueryEngine(
+            sql_database=self.sql_database,
+            tables=self.available_tables,
+            synthesize_response=True,
+            streaming=True,
+            context_str_prefix=self._static_context()
+        )
+
+    def _has_products_table(self) -> bool:
+        """Whether the connected database has a products table."""
+        return 'products' in [t.lower() for t in self.available_tables]
+
+    def _static_context(self) -> str:
+        """Database context that does not depend on the question."""
+        context_info = []
+        try:
+            if self.engine and self._has_products_table():
+                categories = _read_product_categories(self._engine_key(), self.engine)
+                context_info.append(
+                    f"The products table has these categories: {', '.join(categories)}.")
+        except Exception:
+            # If context building fails, continue without it
+            pass
+
+        context_info.append(_PRODUCT_SQL_GUIDANCE)
+        return "\n\n".join(context_info)
+
+    def natural_language_to_sql(
+            self, question: str) -> Tuple[str | None, pd.DataFrame | str | Iterator[str] | None] | None:
+        """Convert natural language question to SQL and execute.
+
+        When no SQL query can be recovered from the response, the synthesized
+        answer is returned instead of a DataFrame, as text chunks to stream.
+        """
         try:
             if not self.sql_database:
                 st.error("No database connection")
@@ -191,15 +527,12 @@ class DatabaseHandler:
             # Enhance the question with context about the database structure
             enhanced_question = self._enhance_question_with_context(question)
 
-            # Create query engine
-            query_engine = NLSQLTableQueryEngine(
-                sql_database=self.sql_database,
-                tables=self.available_tables,
-                synthesize_response=True
-            )
+            # Reuse the query engine built when the tables were loaded
+            if self.query_engine is None:
+                self.query_engine = self._build_query_engine()
 
             # Execute natural language query with enhanced context
-            response = query_engine.query(enhanced_question)
+            response = self.query_engine.query(enhanced_question)
 
             # Extract SQL query from response metadata
             sql_query = getattr(response, 'metadata', {}).get(
@@ -207,66 +540,59 @@ class DatabaseHandler:
 
             # Execute the SQL query to get DataFrame
             if sql_query and sql_query != 'Query not available':
-                df = self.execute_sql_query(sql_query)
+                # Generated SQL often has no LIMIT; cap what is read back
+                sql_query = _enforce_limit(sql_query, settings.MAX_QUERY_ROWS)
+                df = self.execute_sql_query(sql_query, max_rows=settings.MAX_QUERY_ROWS)
                 return sql_query, df
             else:
                 # If we can't extract the SQL, return the response as text
-                return None, pd.DataFrame({'Response': [str(response)]})
+                response_gen = getattr(response, 'response_gen', None)
+                if response_gen is not None:
+                    return None, response_gen
+                return None, getattr(response, 'response', None) or str(response)
 
         except SQLAlchemyError as e:
             st.error(f"Failed to process natural language query: {str(e)}")
             return None
 
     def _enhance_question_with_context(self, question: str) -> str:
-        """Enhance the question with database context to improve SQL generation."""
+        """Add product names matching terms in the question to improve SQL generation.
+
+        Categories and fixed guidance are part of the query engine's context.
+        """
         # Build context about the database
         context_info = []
 
         try:
-            if self.engine:
-                with self.engine.connect() as conn:
-                    # Get available categories
-                    if 'products' in [t.lower() for t in self.available_tables]:
-                        categories_result = conn.execute(
-                            text("SELECT DISTINCT category FROM products"))
-                        categories = [row[0]
-                                      for row in categories_result.fetchall()]
-                        context_info.append(
-                            f"The products table has these categories: {', '.join(categories)}.")
-
-                        # Check for specific product name matches
-                        search_terms = ['lamp', 'light', 'desk', 'chair', 'computer',
-                                        'phone', 'coffee', 'mug', 'table', 'monitor', 'keyboard']
-                        for term in search_terms:
-                            if term.lower() in question.lower():
-                                sample_result = conn.execute(
-                                    text(
-                                        f"SELECT name FROM products WHERE name ILIKE '%{term}%' LIMIT 5")
-                                )
-                                sample_names = [row[0]
-                                                for row in sample_result.fetchall()]
-                                if sample_names:
-                                    context_info.append(
-                                        f"Products with '{term}' in name: {', '.join(sample_names)}.")
+            if self.engine and self._has_products_table():
+                # Only sample names for the terms the question mentions
+                mentioned = {match.lower() for match in _PRODUCT_SEARCH_RE.findall(question)}
+                terms = [term for term in _PRODUCT_SEARCH_TERMS if term in mentioned]
+
+                if terms:
+                    names_by_term = {term: [] for term in terms}
+                    with self.engine.connect() as conn:
+                        rows = conn.execute(_PRODUCT_NAME_SAMPLES_QUERY, {"terms": terms})
+                        for term, name in rows:
+                            names_by_term[term].append(name)
+
+                    # Check for specific product name matches
+                    for term, sample_names in names_by_term.items():
+                        if sample_names:
+                            context_info.append(
+                                f"Products with '{term}' in name: {', '.join(sample_names)}.")
 
         except Exception:
             # If context building fails, continue without context
             pass
 
-        # Create enhanced question with context and explicit instructions
-        context_str = " ".join(context_info)
-
-        enhanced_question = f"""{question}
-
-Context: {context_str}
+        if not context_info:
+            return question
 
-Important: When searching for product types or items, search the 'name' column using ILIKE for partial matches, not the 'category' column. For example:
-- To find items with 'desk': SELECT * FROM products WHERE name ILIKE '%desk%'
-- To find items with 'lamp': SELECT * FROM products WHERE name ILIKE '%lamp%'
-- Categories are broad groups like 'Furniture', 'Electronics', 'Office Supplies'
-- Product names contain specific items like 'Desk Lamp', 'Standing Desk', 'Coffee Mug'"""
+        context_str = " ".join(context_info)
+        return f"""{question}
 
-        return enhanced_question
+Context: {context_str}"""
 
     def get_database_info(self) -> Dict[str, Any]:
         """Get general database information."""
@@ -274,25 +600,14 @@ Important: When searching for product types or items, search the 'name' column u
             return {}
 
         try:
-            with self.engine.connect() as conn:
-                # Get database version
-                version_result = conn.execute(text("SELECT version()"))
-                version_row = version_result.fetchone()
-                version = version_row[0] if version_row else "Unknown"
-
-                # Get database size
-                size_result = conn.execute(
-                    text("SELECT pg_size_pretty(pg_database_size(current_database()))")
-                )
-                size_row = size_result.fetchone()
-                size = size_row[0] if size_row else "Unknown"
-
-                return {
-                    'version': version,
-                    'size': size,
-                    'total_tables': len(self.available_tables),
-                    'connection_status': self.connection_status
-                }
+            # Version is cached for the server's lifetime, size for a minute
+            engine_key = self._engine_key()
+            return {
+                'version': _read_server_version(engine_key, self.engine),
+                'size': _read_database_size(engine_key, self.engine),
+                'total_tables': len(self.available_tables),
+                'connection_status': self.connection_status
+            }
 
         except SQLAlchemyError as e:
             st.error(f"Failed to get database info: {str(e)}")
@@ -300,19 +615,28 @@ Important: When searching for product types or items, search the 'name' column u
 
     def validate_table_access(self, table_names: List[str]) -> Dict[str, bool]:
         """Validate access to specified tables."""
-        access_status = {}
+        access_status = {table: False for table in table_names}
 
         if not self.engine:
-            return {table: False for table in table_names}
+            return access_status
 
         try:
-            with self.engine.connect() as conn:
-                for table in table_names:
-                    try:
-                        conn.execute(text(f"SELECT 1 FROM {table} LIMIT 1"))
-                        access_status[table] = True
-                    except:
-                        access_status[table] = False
+            # Only tables found during introspection are checked; anything
+            # else (or a table dropped since) is reported inaccessible
+            known = {table: self.table_schemas[table]
+                     for table in table_names if table in self.table_schemas}
+            if not known:
+                return access_status
+
+            with _read_only_connection(self.engine) as conn:
+                rows = conn.execute(_TABLE_PRIVILEGES_QUERY, {
+                    "schemas": [info['schema'] for info in known.values()],
+                    "tables": [info['table'] for info in known.values()],
+                }).fetchall()
+
+            allowed = {(schema, table) for schema, table, can_select in rows if can_select}
+            for table, info in known.items():
+                access_status[table] = (info['schema'], info['table']) in allowed
 
             return access_status
 
@@ -327,4 +651,9 @@ Important: When searching for product types or items, search the 'name' column u
     def refresh_table_list(self):
         """Refresh the list of available tables."""
         if self.connection_status:
-            self._load_table_information()
+            # The shared SQLDatabase reflected the tables when it was built
+            _get_sql_database.clear()
+            self.sql_database = _get_sql_database(
+                _engine_cache_key(self.connection_url), self.engine)
+            self._load_table_information(use_cache=False)
+            self.query_engine = self._build_query_engine()
@@ -3,10 +3,25 @@ Document handling functionality for the AI Chatbot.
 Handles file uploads, processing, and indexing using LlamaIndex.
 """
 import os
+import shutil
+import tempfile
+import threading
+import uuid
+import weakref
 import streamlit as st
-from typing import Optional, Dict, Any
+from typing import BinaryIO, Iterator, Optional, Dict, Any, List, Set, Tuple
 from pathlib import Path
 
+# Buffer size used when copying uploads to disk
+COPY_BUFFER_SIZE = 1 << 20
+
+# WordprocessingML tags read when extracting DOCX text
+_W_NS = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+_W_P = _W_NS + "p"
+_W_T = _W_NS + "t"
+_W_TAB = _W_NS + "tab"
+_W_BREAKS = (_W_NS + "br", _W_NS + "cr")
+
 # Runtime imports with fallbacks
 try:
     from llama_index.core import VectorStoreIndex, Document, StorageContext, Settings  # type: ignore
@@ -38,71 +53,129 @@ except ImportError as e:
         IMPORTS_AVAILABLE = False
         import_error = str(e2)
 
+# Metadata filters keep each session's queries to its own chunks
+try:
+    from llama_index.core.vector_stores import MetadataFilter, MetadataFilters  # type: ignore
+except ImportError:
+    MetadataFilter = MetadataFilters = None
+
+# Runs coroutines from Streamlit's script thread, event loop or not
+try:
+    from llama_index.core.async_utils import asyncio_run  # type: ignore
+except ImportError:
+    asyncio_run = None
+
+# pypdf is PyPDF2's maintained successor, with much faster text extraction
+try:
+    import pypdf  # type: ignore
+except ImportError:
+    pypdf = None
+
 from config.settings import settings
 from src.utils import (
+    copy_with_hash,
     get_file_hash,
+    get_text_hash,
     format_file_size,
     is_valid_file_type,
     sanitize_filename,
     get_timestamp,
-    ensure_directory_exists
+    ensure_directory_exists,
+    clean_old_files
 )
 
 
+@st.cache_resource(show_spinner=False)
+def _get_chroma_collection():
+    """Connect to ChromaDB once per process and return the shared collection.
+
+    Sessions keep their own indexes over it; their chunks are told apart by
+    the session_id metadata.
+    """
+    # Connect to ChromaDB running in Docker
+    chroma_client = chromadb.HttpClient(  # type: ignore
+        host="localhost",
+        port=8000
+    )
+    return chroma_client.get_or_create_collection("documents")
+
+
 class DocumentHandler:
     """Handles document processing and indexing."""
 
     def __init__(self):
         """Initialize the document handler."""
-        self.upload_dir = settings.UPLOAD_DIR
+        # One handler per browser session; its uploads and chunks are tagged
+        # with this id so sessions never see or delete each other's files
+        self.session_id = uuid.uuid4().hex
+        ensure_directory_exists(settings.UPLOAD_DIR)
+        self.upload_dir = os.path.join(settings.UPLOAD_DIR, self.session_id)
+        # The session's uploads go with its handler; sessions whose handler
+        # never got collected (e.g. a crash) are swept by age on startup
+        weakref.finalize(self, shutil.rmtree, self.upload_dir, True)
+        clean_old_files(settings.UPLOAD_DIR)
         self.data_dir = settings.DATA_DIR
-        ensure_directory_exists(self.upload_dir)
         ensure_directory_exists(self.data_dir)
 
         # Initialize ChromaDB
-        self.chroma_client = None
+        self.chroma_collection = None
         self.vector_store = None
         self.storage_context = None
         self.document_index = None
+        # Guards creation of the index when documents are processed
+        # concurrently
+        self._index_lock = threading.Lock()
+        # Hashes of chunks already sent to the index, per file hash, so a
+        # re-processed file is not embedded twice
+        self._indexed_chunks: Dict[str, Set[str]] = {}
+
+        # ChromaDB and LlamaIndex are set up on first use, not at startup
+        self._initialized = False
+        self._init_lock = threading.Lock()
 
-        if IMPORTS_AVAILABLE:
-            self._initialize_vector_store()
-            self._initialize_service_context()
-        else:
+        if not IMPORTS_AVAILABLE:
             # Store for later display when features are used
             self.import_error = globals().get(
                 'import_error', 'LlamaIndex libraries not available')
 
-    def _initialize_vector_store(self):
+    def _ensure_initialized(self) -> bool:
+        """Connect to ChromaDB and configure LlamaIndex on first use."""
+        if self._initialized:
+            return True
+
+        with self._init_lock:
+            # Only mark setup done once both steps succeed, so a ChromaDB
+            # outage on first use is retried on the next call
+            if not self._initialized:
+                self._initialized = (self._initialize_vector_store()
+                                     and self._initialize_service_context())
+        return self._initialized
+
+    def _initialize_vector_store(self) -> bool:
         """Initialize ChromaDB vector store."""
         if not IMPORTS_AVAILABLE:
             st.error(
                 "Cannot initialize vector store: Required libraries not available")
-            return
+            return False
 
         try:
-            # Connect to ChromaDB running in Docker
-            self.chroma_client = chromadb.HttpClient(  # type: ignore
-                host="localhost",
-                port=8000
-            )
-
-            chroma_collection = self.chroma_client.get_or_create_collection(
-                "documents")
+            self.chroma_collection = _get_chroma_collection()
             self.vector_store = ChromaVectorStore(  # type: ignore
-                chroma_collection=chroma_collection)
+                chroma_collection=self.chroma_collection)
             self.storage_context = StorageContext.from_defaults(  # type: ignore
                 vector_store=self.vector_store)
-        except (ConnectionError, OSError, ImportError, AttributeError) as e:
+            return True
+        except (ConnectionError, OSError, ImportError, AttributeError, ValueError) as e:
             st.error(f"Failed to initialize vector store: {e}")
             st.error("Make sure ChromaDB is running: docker-compose up -d chromadb")
+            return False
 
-    def _initialize_service_context(self):
+    def _initialize_service_context(self) -> bool:
         """Initialize LlamaIndex settings."""
         if not IMPORTS_AVAILABLE:
             st.error(
                 "Cannot initialize service context: Required libraries not available")
-            return
+            return False
 
         try:
             temperature = st.session_state.get(
@@ -116,13 +189,18 @@ class DocumentHandler:
                     temperature=temperature,
                     api_key=settings.OPENAI_API_KEY
                 )
+                # Embedding batches run concurrently (bounded) when the
+                # index is built or updated asynchronously
                 Settings.embed_model = OpenAIEmbedding(  # type: ignore
-                    api_key=settings.OPENAI_API_KEY)
+                    api_key=settings.OPENAI_API_KEY,
+                    num_workers=settings.EMBED_CONCURRENCY)
                 Settings.chunk_size = settings.DEFAULT_CHUNK_SIZE
                 Settings.chunk_overlap = settings.DEFAULT_CHUNK_OVERLAP
+            return True
 
         except (ImportError, AttributeError, ValueError) as e:
             st.error(f"Failed to initialize service context: {e}")
+            return False
 
     def validate_file(self, uploaded_file) -> Dict[str, Any]:
         """Validate uploaded file."""
@@ -133,7 +211,7 @@ class DocumentHandler:
         }
 
         # Check file type
-        if not is_valid_file_type(uploaded_file.name, settings.SUPPORTED_FILE_TYPES):
+        if not is_valid_file_type(uploaded_file.name, settings.SUPPORTED_FILE_TYPES_SET):
             validation_result[
                 "error_message"] = f"Unsupported file type. Supported types: {', '.join(settings.SUPPORTED_FILE_TYPES)}"
             return validation_result
@@ -160,17 +238,56 @@ class DocumentHandler:
 
         return validation_result
 
-    def save_uploaded_file(self, uploaded_file) -> Optional[str]:
+    @staticmethod
+    def get_file_hash_stream(file_obj: BinaryIO) -> str:
+        """Hash a file-like object in chunks without loading it into memory."""
+        return get_file_hash(file_obj)
+
+    def save_uploaded_file(self, uploaded_file, file_hash: Optional[str] = None) -> Optional[str]:
         """Save uploaded file to uploads directory."""
         try:
-            file_content = uploaded_file.read()
-            file_hash = get_file_hash(file_content)
             sanitized_name = sanitize_filename(uploaded_file.name)
-            file_path = os.path.join(
-                self.upload_dir, f"{file_hash}_{sanitized_name}")
-
-            with open(file_path, "wb") as f:
-                f.write(file_content)
+            uploaded_file.seek(0)
+            ensure_directory_exists(self.upload_dir)
+
+            # Same content already uploaded: reuse it instead of rewriting
+            existing = self._existing_upload_path(file_hash)
+            if existing is not None:
+                return existing
+
+            if file_hash is None:
+                # Hash while streaming to a temporary file, then move it into
+                # place under its hash, so the bytes are read only once
+                fd, tmp_path = tempfile.mkstemp(dir=self.upload_dir, suffix=".part")
+                try:
+                    with os.fdopen(fd, "wb") as f:
+                        file_hash = copy_with_hash(uploaded_file, f, COPY_BUFFER_SIZE)
+                    existing = self._existing_upload_path(file_hash)
+                    if existing is not None:
+                        os.remove(tmp_path)
+                        return existing
+                    file_path = os.path.join(
+                        self.upload_dir, f"{file_hash}_{sanitized_name}")
+                    os.replace(tmp_path, file_path)
+                except BaseException:
+                    if os.path.exists(tmp_path):
+                        os.remove(tmp_path)
+                    raise
+            else:
+                file_path = os.path.join(
+                    self.upload_dir, f"{file_hash}_{sanitized_name}")
+
+                # Stream to disk in fixed-size blocks instead of reading it whole;
+                # a file already stored under this hash has the same bytes
+                if not os.path.exists(file_path):
+                    with open(file_path, "wb") as f:
+                        if hasattr(uploaded_file, "getbuffer"):
+                            # In-memory uploads are written from their buffer
+                            # in one call, without copying it into chunks
+                            with uploaded_file.getbuffer() as view:
+                                f.write(view)
+                        else:
+                            shutil.copyfileobj(uploaded_file, f, length=COPY_BUFFER_SIZE)
 
             # Store file metadata
             file_metadata = {
@@ -194,52 +311,142 @@ class DocumentHandler:
             st.error(f"Failed to save file: {e}")
             return None
 
+    def _existing_upload_path(self, file_hash: Optional[str]) -> Optional[str]:
+        """Return the stored path of an upload with this hash, if any."""
+        file_metadata = st.session_state.get("uploaded_files", {}).get(file_hash)
+        if file_metadata and os.path.exists(file_metadata["file_path"]):
+            return file_metadata["file_path"]
+        return None
+
+    def is_processed(self, file_hash: str) -> bool:
+        """Check whether a file's content is already in the index."""
+        return st.session_state.get("uploaded_files", {}).get(file_hash, {}).get("processed", False)
+
     def process_document(self, file_path: str, file_hash: str) -> bool:
         """Process document and add to index."""
+        return self.process_documents([(file_path, file_hash)])[0]
+
+    def process_documents(self, items: List[Tuple[str, str]]) -> List[bool]:
+        """Process several (file_path, file_hash) documents and index them together.
+
+        Indexing the whole batch at once lets the embedding model embed chunks
+        from every document in shared requests instead of one call per file.
+        """
+        # Already-indexed content is not extracted or embedded again
+        pending = [(file_path, file_hash) for file_path, file_hash in items
+                   if not self.is_processed(file_hash)]
+        documents = {
+            file_hash: self.load_document(file_path, file_hash)
+            for file_path, file_hash in pending
+        }
+        loaded = [document for file_documents in documents.values() if file_documents
+                  for document in file_documents]
+        if loaded and not self.index_documents(loaded):
+            return [self.is_processed(file_hash) for _, file_hash in items]
+        return [self.is_processed(file_hash) or documents.get(file_hash) is not None
+                for _, file_hash in items]
+
+    def load_document(self, file_path: str, file_hash: str) -> Optional[List[Any]]:
+        """Extract a saved file's text into Documents, without indexing them.
+
+        PDFs give one Document per page, tagged with its page_label, so
+        chunks keep their page; other files give a single Document.
+        """
         if not IMPORTS_AVAILABLE:
             st.error("Cannot process document: Required libraries not available")
-            return False
+            return None
 
         try:
+            metadata = {
+                "file_path": file_path,
+                "file_hash": file_hash,
+                "file_name": st.session_state.uploaded_files[file_hash]["original_name"],
+                "upload_time": st.session_state.uploaded_files[file_hash]["upload_time"],
+                "session_id": self.session_id
+            }
+
             # Extract text based on file type
             file_extension = Path(file_path).suffix.lower()
 
             if file_extension == '.pdf':
-                text = self._extract_pdf_text(file_path)
+                sections = [({**metadata, "page_label": str(page_no)}, text)
+                            for page_no, text in self._extract_pdf_pages(file_path)]
             elif file_extension == '.docx':
-                text = self._extract_docx_text(file_path)
+                sections = [(metadata, self._extract_docx_text(file_path))]
             elif file_extension == '.txt':
-                text = self._extract_txt_text(file_path)
+                sections = [(metadata, self._extract_txt_text(file_path))]
             else:
                 st.error(f"Unsupported file type: {file_extension}")
-                return False
+                return None
 
-            if not text.strip():
+            sections = [(meta, text) for meta, text in sections if text.strip()]
+            if not sections:
                 st.error("No text content found in the document")
-                return False
+                return None
 
-            # Create document object
-            document = Document(  # type: ignore
-                text=text,
-                metadata={
-                    "file_path": file_path,
-                    "file_hash": file_hash,
-                    "file_name": st.session_state.uploaded_files[file_hash]["original_name"],
-                    "upload_time": st.session_state.uploaded_files[file_hash]["upload_time"]
-                }
-            )
-
-            # Add to index
-            if self.document_index is None:
-                self.document_index = VectorStoreIndex.from_documents(  # type: ignore
-                    [document],
-                    storage_context=self.storage_context
-                )
-            else:
-                self.document_index.insert(document)
+            # Create document objects
+            # The session tag is for filtering only, never sent to the models
+            return [Document(text=text, metadata=meta,  # type: ignore
+                             excluded_embed_metadata_keys=["session_id"],
+                             excluded_llm_metadata_keys=["session_id"])
+                    for meta, text in sections]
+
+        except (ImportError, AttributeError, ValueError, KeyError) as e:
+            st.error(f"Failed to process document: {e}")
+            return None
+
+    def index_documents(self, documents: List[Any]) -> bool:
+        """Add loaded documents to the index in one batch."""
+        if not IMPORTS_AVAILABLE:
+            st.error("Cannot process document: Required libraries not available")
+            return False
+
+        if not self._ensure_initialized():
+            return False
+
+        try:
+            # Chunk every document first so all new chunks are embedded and
+            # written to the vector store together
+            new_chunks = self._new_chunks(documents) if Settings is not None else None
+            nodes = list(new_chunks.values()) if new_chunks is not None else None
+
+            # Add to index; only the first batch builds it, under the lock
+            created = False
+            with self._index_lock:
+                if self.document_index is None:
+                    if nodes is not None:
+                        self.document_index = VectorStoreIndex(  # type: ignore
+                            nodes,
+                            storage_context=self.storage_context,
+                            use_async=True
+                        )
+                    else:
+                        self.document_index = VectorStoreIndex.from_documents(  # type: ignore
+                            documents,
+                            storage_context=self.storage_context,
+                            use_async=True
+                        )
+                    created = True
+            if not created:
+                if nodes is not None:
+                    if nodes and asyncio_run is not None:
+                        # insert_nodes always embeds one batch at a time;
+                        # the async variant runs EMBED_CONCURRENCY batches
+                        # at once, like the initial build
+                        asyncio_run(self.document_index.ainsert_nodes(nodes))
+                    elif nodes:
+                        self.document_index.insert_nodes(nodes)
+                else:
+                    for document in documents:
+                        self.document_index.insert(document)
+
+            if new_chunks:
+                for file_hash, chunk_hash in new_chunks:
+                    self._indexed_chunks.setdefault(file_hash, set()).add(chunk_hash)
 
             # Update metadata
-            st.session_state.uploaded_files[file_hash]["processed"] = True
+            for document in documents:
+                st.session_state.uploaded_files[document.metadata["file_hash"]]["processed"] = True
 
             return True
 
@@ -247,21 +454,41 @@ class DocumentHandler:
             st.error(f"Failed to process document: {e}")
             return False
 
-    def _extract_pdf_text(self, file_path: str) -> str:
-        """Extract text from PDF file."""
+    def _new_chunks(self, documents: List[Any]) -> Dict[Tuple[str, str], Any]:
+        """Split documents into chunks keyed by (file hash, text hash), minus indexed ones.
+
+        Identical text in two files is kept in both, so each chunk's source
+        metadata points at the file it came from.
+        """
+        # Settings.node_parser is a SentenceSplitter sized by
+        # DEFAULT_CHUNK_SIZE / DEFAULT_CHUNK_OVERLAP
+        new_chunks = {}
+        for node in Settings.node_parser.get_nodes_from_documents(documents):
+            file_hash = node.metadata["file_hash"]
+            chunk_hash = get_text_hash(node.get_content())
+            if chunk_hash not in self._indexed_chunks.get(file_hash, ()):
+                new_chunks.setdefault((file_hash, chunk_hash), node)
+        return new_chunks
+
+    def _iter_pdf_pages(self, file_path: str) -> Iterator[Tuple[int, str]]:
+        """Yield (page_no, text) for each PDF page as it is extracted."""
+        reader_cls = pypdf.PdfReader if pypdf is not None else PyPDF2.PdfReader  # type: ignore
+        with open(file_path, 'rb') as file:
+            pdf_reader = reader_cls(file)
+            for page_no, page in enumerate(pdf_reader.pages, start=1):
+                yield page_no, page.extract_text() or ""
+
+    def _extract_pdf_pages(self, file_path: str) -> List[Tuple[int, str]]:
+        """Extract text from PDF file, page by page."""
         if not IMPORTS_AVAILABLE:
             st.error("PDF reading not available: PyPDF2 library not installed")
-            return ""
+            return []
 
-        text = ""
         try:
-            with open(file_path, 'rb') as file:
-                pdf_reader = PyPDF2.PdfReader(file)  # type: ignore
-                for page in pdf_reader.pages:
-                    text += page.extract_text() + "\n"
+            return list(self._iter_pdf_pages(file_path))
         except (OSError, IOError, AttributeError) as e:
             st.error(f"Failed to extract PDF text: {e}")
-        return text
+        return []
 
     def _extract_docx_text(self, file_path: str) -> str:
         """Extract text from DOCX file."""
@@ -270,29 +497,39 @@ class DocumentHandler:
                 "DOCX reading not available: python-docx library not installed")
             return ""
 
-        text = ""
         try:
             doc = docx.Document(file_path)  # type: ignore
-            for paragraph in doc.paragraphs:
-                text += paragraph.text + "\n"
+            # Walk the body's XML directly rather than wrapping every
+            # paragraph and run in python-docx objects
+            parts = []
+            for paragraph in doc.element.body.iterchildren(_W_P):
+                for node in paragraph.iter(_W_T, _W_TAB, *_W_BREAKS):
+                    if node.tag == _W_T:
+                        parts.append(node.text or "")
+                    elif node.tag == _W_TAB:
+                        parts.append("\t")
+                    else:
+                        parts.append("\n")
+                parts.append("\n")
+            return "".join(parts)
         except (OSError, IOError, AttributeError) as e:
             st.error(f"Failed to extract DOCX text: {e}")
-        return text
+        return ""
 
     def _extract_txt_text(self, file_path: str) -> str:
         """Extract text from TXT file."""
         text = ""
         try:
-            with open(file_path, 'r', encoding='utf-8') as file:
-                text = file.read()
-        except UnicodeDecodeError:
-            try:
-                with open(file_path, 'r', encoding='latin-1') as file:
-                    text = file.read()
-            except (OSError, IOError, UnicodeDecodeError) as e:
-                st.error(f"Failed to extract TXT text: {e}")
+            # Read once; the latin-1 fallback decodes the same bytes
+            data = Path(file_path).read_bytes()
         except (OSError, IOError) as e:
             st.error(f"Failed to extract TXT text: {e}")
+            return text
+
+        try:
+            text = data.decode('utf-8')
+        except UnicodeDecodeError:
+            text = data.decode('latin-1')
         return text
 
     def delete_document(self, file_hash: str) -> bool:
@@ -311,8 +548,10 @@ class DocumentHandler:
             # Remove from session state
             del st.session_state.uploaded_files[file_hash]
 
-            # Note: ChromaDB doesn't easily support removing specific documents
-            # For production, you might want to rebuild the index or use a different approach
+            # Remove this session's chunks of the file from the vector store
+            self._delete_vectors({"$and": [{"session_id": self.session_id},
+                                           {"file_hash": file_hash}]})
+            self._indexed_chunks.pop(file_hash, None)
 
             return True
 
@@ -331,14 +570,17 @@ class DocumentHandler:
             for file_hash in list(st.session_state.get("uploaded_files", {}).keys()):
                 self.delete_document(file_hash)
 
-            # Reset index
+            # Reset index, dropping any chunks of this session left behind
+            self._delete_vectors({"session_id": self.session_id})
             self.document_index = None
+            self._indexed_chunks.clear()
 
-            # Clear uploads directory
-            for filename in os.listdir(self.upload_dir):
-                file_path = os.path.join(self.upload_dir, filename)
-                if os.path.isfile(file_path):
-                    os.remove(file_path)
+            # Clear this session's uploads directory
+            if os.path.isdir(self.upload_dir):
+                with os.scandir(self.upload_dir) as entries:
+                    for entry in entries:
+                        if entry.is_file():
+                            os.remove(entry.path)
 
             return True
 
@@ -346,7 +588,7 @@ class DocumentHandler:
             st.error(f"Failed to clear documents: {e}")
             return False
 
-    def get_query_engine(self):
+    def get_query_engine(self, streaming: bool = False):
         """Get query engine for document search."""
         if not IMPORTS_AVAILABLE:
             st.error("Cannot create query engine: Required libraries not available")
@@ -354,4 +596,19 @@ class DocumentHandler:
 
         if self.document_index is None:
             return None
-        return self.document_index.as_query_engine()
+        if MetadataFilters is None:
+            return self.document_index.as_query_engine(streaming=streaming)
+        # The collection is shared, so retrieve only this session's chunks
+        return self.document_index.as_query_engine(
+            streaming=streaming,
+            filters=MetadataFilters(filters=[
+                MetadataFilter(key="session_id", value=self.session_id)]))
+
+    def _delete_vectors(self, where: Dict[str, Any]) -> None:
+        """Delete chunks matching a ChromaDB where-filter, if connected."""
+        if self.chroma_collection is None:
+            return
+        try:
+            self.chroma_collection.delete(where=where)
+        except Exception as e:  # ChromaDB raises its own error types
+            st.warning(f"Could not remove document chunks from the vector store: {e}")
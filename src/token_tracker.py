@@ -1,8 +1,11 @@
 """
 Token tracking and cost calculation utilities for OpenAI API usage.
 """
+import functools
+import time
 import tiktoken
-from typing import Dict, Any, Tuple
+from collections import deque
+from typing import Dict, Any, List, Tuple
 from datetime import datetime
 import streamlit as st
 import json
@@ -53,8 +56,36 @@ def get_fallback_pricing() -> Dict[str, Dict[str, float]]:
     }
 
 
-# Load pricing at module level (will be refreshed when module is reloaded)
-OPENAI_PRICING = load_pricing_config()
+@functools.lru_cache(maxsize=None)
+def _pricing() -> Dict[str, Dict[str, float]]:
+    """Return the pricing table, read from disk on first use."""
+    return load_pricing_config()
+
+
+@functools.lru_cache(maxsize=8)
+def _get_encoding(model: str):
+    """Return the tiktoken encoding for a model, built once per model."""
+    try:
+        # Knows newer models too (e.g. gpt-4o uses o200k_base)
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+
+
+# Texts up to this length have their token counts memoized; the cache keeps
+# the text itself as its key, so very long texts are always encoded afresh
+_COUNT_CACHE_MAX_CHARS = 16 * 1024
+
+
+# Fewer texts too long for the memo than this are encoded one by one
+# instead of through encode_batch
+_BATCH_ENCODE_MIN_TEXTS = 8
+
+
+@functools.lru_cache(maxsize=1024)
+def _count_tokens_cached(model: str, text: str) -> int:
+    """Token count for a text, remembered for repeated prompts."""
+    return len(_get_encoding(model).encode(text, disallowed_special=()))
 
 
 class TokenTracker:
@@ -69,9 +100,8 @@ class TokenTracker:
     def refresh_pricing(self) -> bool:
         """Refresh pricing data from configuration file."""
         try:
-            global OPENAI_PRICING
-            new_pricing = load_pricing_config()
-            OPENAI_PRICING = new_pricing
+            _pricing.cache_clear()
+            new_pricing = _pricing()
             self._pricing_cache = new_pricing
             self._pricing_last_loaded = datetime.now()
             return True
@@ -88,7 +118,7 @@ class TokenTracker:
             "pricing_source": "hardcoded_fallback",
             "last_updated": "unknown",
             "config_file_exists": config_path.exists(),
-            "models_count": len(OPENAI_PRICING)
+            "models_count": len(_pricing())
         }
 
         try:
@@ -110,42 +140,63 @@ class TokenTracker:
                 "total_cost": 0.0,
                 "session_tokens": 0,
                 "session_cost": 0.0,
-                "requests": []
+                # Only the most recent requests are kept
+                "requests": deque(maxlen=100)
             }
 
     def count_tokens(self, text: str, model: str = "gpt-3.5-turbo") -> int:
         """Count tokens in text using tiktoken."""
         try:
-            # Map model names to tiktoken encodings
-            encoding_map = {
-                "gpt-4": "cl100k_base",
-                "gpt-4-turbo": "cl100k_base",
-                "gpt-4-turbo-preview": "cl100k_base",
-                "gpt-4o": "cl100k_base",
-                "gpt-4o-mini": "cl100k_base",
-                "gpt-3.5-turbo": "cl100k_base",
-                "gpt-3.5-turbo-0125": "cl100k_base",
-                "gpt-3.5-turbo-instruct": "cl100k_base",
-                "text-embedding-ada-002": "cl100k_base",
-                "text-embedding-3-small": "cl100k_base",
-                "text-embedding-3-large": "cl100k_base",
-            }
-
-            encoding_name = encoding_map.get(model, "cl100k_base")
-            encoding = tiktoken.get_encoding(encoding_name)
-            return len(encoding.encode(text))
+            if len(text) <= _COUNT_CACHE_MAX_CHARS:
+                return _count_tokens_cached(model, text)
+            # Special-token text is counted as ordinary text, not rejected
+            return len(_get_encoding(model).encode(text, disallowed_special=()))
 
         except Exception:
             # Fallback: rough estimation (1 token ≈ 4 characters)
             return len(text) // 4
 
+    def count_tokens_batch(self, texts: List[str], model: str = "gpt-3.5-turbo") -> List[int]:
+        """Count tokens for several texts, memo first.
+
+        Texts short enough for the memo go through count_tokens. Longer ones
+        are encoded together with encode_batch only when there are at least
+        _BATCH_ENCODE_MIN_TEXTS of them; starting its thread pool costs more
+        than encoding a few texts one by one.
+        """
+        counts = [None] * len(texts)
+        uncached = []
+        for i, text in enumerate(texts):
+            if len(text) <= _COUNT_CACHE_MAX_CHARS:
+                counts[i] = self.count_tokens(text, model)
+            else:
+                uncached.append(i)
+
+        if len(uncached) >= _BATCH_ENCODE_MIN_TEXTS:
+            try:
+                # encode_batch releases the GIL and encodes the texts in parallel
+                encoded = _get_encoding(model).encode_batch(
+                    [texts[i] for i in uncached],
+                    num_threads=min(len(uncached), 8), disallowed_special=()
+                )
+                for i, tokens in zip(uncached, encoded):
+                    counts[i] = len(tokens)
+                return counts
+            except Exception:
+                pass
+
+        for i in uncached:
+            counts[i] = self.count_tokens(texts[i], model)
+        return counts
+
     def calculate_cost(self, input_tokens: int, output_tokens: int, model: str) -> float:
         """Calculate cost for token usage."""
-        if model not in OPENAI_PRICING:
+        openai_pricing = _pricing()
+        if model not in openai_pricing:
             # Use gpt-3.5-turbo as default
             model = "gpt-3.5-turbo"
 
-        pricing = OPENAI_PRICING[model]
+        pricing = openai_pricing[model]
         input_cost = (input_tokens / 1000) * pricing["input"]
         output_cost = (output_tokens / 1000) * pricing["output"]
 
@@ -157,6 +208,7 @@ class TokenTracker:
                       model: str,
                       request_type: str = "chat") -> Dict[str, Any]:
         """Track a single API request and return usage info."""
+        # Counted one at a time so repeated prompts come from the memo
         input_tokens = self.count_tokens(input_text, model)
         output_tokens = self.count_tokens(output_text, model)
         total_tokens = input_tokens + output_tokens
@@ -164,7 +216,8 @@ class TokenTracker:
 
         # Create request record
         request_info = {
-            "timestamp": datetime.now().isoformat(),
+            # Epoch seconds; format with datetime.fromtimestamp() for display
+            "timestamp": time.time(),
             "model": model,
             "type": request_type,
             "input_tokens": input_tokens,
@@ -178,12 +231,9 @@ class TokenTracker:
         st.session_state.token_usage["total_cost"] += cost
         st.session_state.token_usage["session_tokens"] += total_tokens
         st.session_state.token_usage["session_cost"] += cost
+        # Bounded deque: the oldest request drops out past 100
         st.session_state.token_usage["requests"].append(request_info)
 
-        # Keep only last 100 requests to avoid memory issues
-        if len(st.session_state.token_usage["requests"]) > 100:
-            st.session_state.token_usage["requests"] = st.session_state.token_usage["requests"][-100:]
-
         return request_info
 
     def get_session_summary(self) -> Dict[str, Any]:
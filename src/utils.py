@@ -3,40 +3,117 @@ Utility functions for the AI Chatbot application.
 """
 import os
 import hashlib
+import importlib.util
 from datetime import datetime
-from typing import List, Optional
+from typing import Any, BinaryIO, Collection, Optional
 
+from config.settings import settings
 
-def get_file_hash(file_content: bytes) -> str:
-    """Generate MD5 hash for file content."""
-    return hashlib.md5(file_content).hexdigest()
+# Optional fast hashes; hashes only deduplicate uploads
+try:
+    import xxhash  # type: ignore
+except ImportError:
+    xxhash = None
+
+try:
+    import blake3  # type: ignore
+except ImportError:
+    blake3 = None
+
+HASH_CHUNK_SIZE = 64 * 1024
+
+
+class _Blake3Hasher:
+    """BLAKE3 truncated to 128 bits, matching the other upload hashes."""
+
+    def __init__(self):
+        self._hasher = blake3.blake3()
+
+    def update(self, data) -> None:
+        self._hasher.update(data)
+
+    def hexdigest(self) -> str:
+        return self._hasher.hexdigest(length=16)
+
+
+def _new_file_hasher():
+    """Return the upload hasher selected by settings.HASH_ALGO.
+
+    "auto" picks xxh3-128, then BLAKE3, then BLAKE2b, depending on which
+    optional packages are installed. An unavailable choice falls back to
+    BLAKE2b; "sha256" uses OpenSSL (SHA-NI where the CPU has it).
+    """
+    algo = settings.HASH_ALGO
+    if algo in ("auto", "xxh3") and xxhash is not None:
+        return xxhash.xxh3_128()
+    if algo in ("auto", "blake3") and blake3 is not None:
+        return _Blake3Hasher()
+    if algo == "sha256":
+        return hashlib.sha256()
+    return hashlib.blake2b(digest_size=16)
+
+
+def get_file_hash(file_obj: BinaryIO) -> str:
+    """Hash a file-like object without loading it into a new buffer.
+
+    In-memory uploads (BytesIO) are hashed straight from their buffer;
+    other streams are read in chunks. The stream is rewound afterwards so
+    callers can read it again.
+    """
+    hasher = _new_file_hasher()
+    if hasattr(file_obj, "getbuffer"):
+        with file_obj.getbuffer() as view:
+            hasher.update(view)
+    else:
+        for chunk in iter(lambda: file_obj.read(HASH_CHUNK_SIZE), b''):
+            hasher.update(chunk)
+    file_obj.seek(0)
+    return hasher.hexdigest()
+
+
+def copy_with_hash(file_obj: BinaryIO, dest: BinaryIO, chunk_size: int = HASH_CHUNK_SIZE) -> str:
+    """Copy a stream to dest in chunks, hashing it in the same pass."""
+    hasher = _new_file_hasher()
+    for chunk in iter(lambda: file_obj.read(chunk_size), b''):
+        hasher.update(chunk)
+        dest.write(chunk)
+    return hasher.hexdigest()
+
+
+def get_text_hash(text: str) -> str:
+    """Hash a piece of text with the configured upload hash."""
+    hasher = _new_file_hasher()
+    hasher.update(text.encode("utf-8"))
+    return hasher.hexdigest()
+
+
+_SIZE_UNITS = ("B", "KB", "MB", "GB")
 
 
 def format_file_size(size_bytes: int) -> str:
     """Format file size in human readable format."""
     if size_bytes == 0:
         return "0B"
-    size_names = ["B", "KB", "MB", "GB"]
-    i = 0
-    while size_bytes >= 1024 and i < len(size_names) - 1:
-        size_bytes /= 1024.0
-        i += 1
-    return f"{size_bytes:.1f}{size_names[i]}"
+    # Each unit is 2**10 of the previous one, so the bit length picks it
+    i = min((max(int(size_bytes), 1).bit_length() - 1) // 10, len(_SIZE_UNITS) - 1)
+    return f"{size_bytes / (1 << (10 * i)):.1f}{_SIZE_UNITS[i]}"
 
 
-def is_valid_file_type(filename: str, allowed_types: List[str]) -> bool:
+def is_valid_file_type(filename: str, allowed_types: Collection[str]) -> bool:
     """Check if file type is supported."""
-    file_extension = filename.split('.')[-1].lower()
+    # rpartition splits once at the last dot; pass a set for fast lookups
+    file_extension = filename.rpartition('.')[2].lower()
     return file_extension in allowed_types
 
 
+# Unsafe filename characters, each replaced with an underscore
+_SANITIZE_TABLE = str.maketrans({char: '_' for char in '<>:"/\\|?*'})
+
+
 def sanitize_filename(filename: str) -> str:
     """Sanitize filename for safe storage."""
-    # Remove or replace unsafe characters
-    unsafe_chars = ['<', '>', ':', '"', '/', '\\', '|', '?', '*']
-    for char in unsafe_chars:
-        filename = filename.replace(char, '_')
-    return filename
+    # Replace every unsafe character in a single pass
+    return filename.translate(_SANITIZE_TABLE)
 
 
 def get_timestamp() -> str:
@@ -50,18 +127,30 @@ def ensure_directory_exists(directory_path: str) -> None:
 
 
 def clean_old_files(directory: str, max_age_hours: int = 24) -> None:
-    """Remove files older than specified hours."""
+    """Remove files older than specified hours.
+
+    Subdirectories (e.g. per-session upload folders) are cleaned too, and
+    removed once they are empty.
+    """
     if not os.path.exists(directory):
         return
 
     current_time = datetime.now()
-    for filename in os.listdir(directory):
-        file_path = os.path.join(directory, filename)
-        if os.path.isfile(file_path):
-            file_time = datetime.fromtimestamp(os.path.getctime(file_path))
-            age_hours = (current_time - file_time).total_seconds() / 3600
-            if age_hours > max_age_hours:
-                os.remove(file_path)
+    # scandir entries carry the file type from the directory listing
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                clean_old_files(entry.path, max_age_hours)
+                try:
+                    os.rmdir(entry.path)
+                except OSError:
+                    # Not empty: a session still has recent uploads
+                    pass
+            elif entry.is_file():
+                file_time = datetime.fromtimestamp(entry.stat().st_ctime)
+                age_hours = (current_time - file_time).total_seconds() / 3600
+                if age_hours > max_age_hours:
+                    os.remove(entry.path)
 
 
 def truncate_text(text: str, max_length: int = 100) -> str:
@@ -71,11 +160,21 @@ def truncate_text(text: str, max_length: int = 100) -> str:
     return text[:max_length - 3] + "..."
 
 
-def validate_connection_string(connection_string: Optional[str]) -> bool:
-    """Validate database connection string format."""
+def get_postgres_drivername() -> str:
+    """Return the SQLAlchemy driver name, preferring psycopg 3 when installed."""
+    if importlib.util.find_spec("psycopg") is not None:
+        return "postgresql+psycopg"
+    return "postgresql+psycopg2"
+
+
+def validate_connection_string(connection_string: Optional[Any]) -> bool:
+    """Validate a PostgreSQL connection string or SQLAlchemy URL."""
     if not connection_string:
         return False
-    return connection_string.startswith(('postgresql://', 'postgres://'))
+    if isinstance(connection_string, str):
+        return connection_string.startswith(('postgresql://', 'postgres://'))
+    drivername = getattr(connection_string, "drivername", "")
+    return drivername.startswith("postgres")
 
 
 def format_sql_query(query: str) -> str:
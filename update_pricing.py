@@ -14,25 +14,143 @@ Usage:
     python update_pricing.py --method manual
 """
 
+import importlib.util
 import json
-import requests
-from bs4 import BeautifulSoup
-from typing import Dict, Any, Optional
+import re
+from types import MappingProxyType
+from typing import Dict, Any, Mapping, Optional
 import argparse
 import sys
+import queue
+import threading
 from datetime import datetime
 import os
 from pathlib import Path
 
+# orjson is a much faster JSON encoder; fall back to the stdlib json
+try:
+    import orjson  # type: ignore
+except ImportError:
+    orjson = None
+
+
+def _dump_json(data: Dict[str, Any]) -> bytes:
+    """Serialize pricing data as 2-space indented JSON."""
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_INDENT_2)
+    return json.dumps(data, indent=2).encode("utf-8")
+
+
+def _load_json(raw: bytes) -> Any:
+    """Parse JSON bytes."""
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
+# User-Agent sent with every pricing request
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+
+# OPENAI_PRICING = {...} literal, for when libcst is unavailable. Braces are
+# excluded from the repeated runs, so each character has only one way to
+# match and nested entries end at their own brace
+_PRICING_RE = re.compile(r'OPENAI_PRICING\s*=\s*\{[^{}]*(?:\{[^{}]*\}[^{}]*)*\}', re.DOTALL)
+
+# BeautifulSoup backend: lxml's C parser when installed, else the stdlib one
+HTML_PARSER = "lxml" if importlib.util.find_spec("lxml") else "html.parser"
+
+# The auto method skips fetching when the saved config is younger than this
+PRICING_FRESHNESS_DAYS = int(os.getenv("PRICING_FRESHNESS_DAYS", "7"))
+
+# Pricing used when nothing else is available; frozen at every level, so
+# _get_fallback_pricing hands out copies
+_FALLBACK_PRICING: Mapping[str, Any] = MappingProxyType({
+    model: MappingProxyType(prices) if isinstance(prices, dict) else prices
+    for model, prices in {
+        "gpt-4": {"input": 0.03, "output": 0.06},
+        "gpt-4-turbo": {"input": 0.01, "output": 0.03},
+        "gpt-4-turbo-preview": {"input": 0.01, "output": 0.03},
+        "gpt-4o": {"input": 0.005, "output": 0.015},
+        "gpt-4o-mini": {"input": 0.00015, "output": 0.0006},
+        "gpt-3.5-turbo": {"input": 0.0015, "output": 0.002},
+        "gpt-3.5-turbo-0125": {"input": 0.0005, "output": 0.0015},
+        "gpt-3.5-turbo-instruct": {"input": 0.0015, "output": 0.002},
+        "text-embedding-ada-002": {"input": 0.0001, "output": 0.0},
+        "text-embedding-3-small": {"input": 0.00002, "output": 0.0},
+        "text-embedding-3-large": {"input": 0.00013, "output": 0.0},
+        "last_updated": "2025-07-28",
+        "source": "fallback"
+    }.items()
+})
+
+# Models a fetched pricing table must include to be accepted
+REQUIRED_PRICING_MODELS = frozenset({"gpt-3.5-turbo", "gpt-4", "gpt-4-turbo"})
+
+
+def _fetch_bytes(url: str) -> Optional[bytes]:
+    """GET a URL with the stdlib; the body, or None unless the status is 200."""
+    # urllib is imported only when a fetch runs
+    import urllib.error
+    import urllib.request
+
+    request = urllib.request.Request(url, headers={'User-Agent': USER_AGENT})
+    try:
+        with urllib.request.urlopen(request, timeout=10) as response:
+            if response.status != 200:
+                return None
+            return response.read()
+    except urllib.error.HTTPError:
+        return None
+
+
+def _fetch_json(url: str) -> Any:
+    """GET a JSON document; None unless the status is 200."""
+    raw = _fetch_bytes(url)
+    return _load_json(raw) if raw is not None else None
+
+
+def _replace_pricing_literal(content: str, pricing_dict: str) -> Optional[str]:
+    """Return content with the OPENAI_PRICING value replaced, or None if absent.
+
+    Uses a libcst syntax-tree edit when libcst is installed, so the rest of
+    the file is reproduced exactly; otherwise falls back to a regex.
+    """
+    try:
+        import libcst as cst  # type: ignore
+    except ImportError:
+        cst = None
+
+    if cst is None:
+        # One substitution pass; the count says whether anything matched
+        new_content, count = _PRICING_RE.subn(
+            lambda _: f'OPENAI_PRICING = {pricing_dict}', content)
+        return new_content if count else None
+
+    module = cst.parse_module(content)
+    body = list(module.body)
+    for i, statement in enumerate(body):
+        if not isinstance(statement, cst.SimpleStatementLine):
+            continue
+        small_statements = list(statement.body)
+        for j, small in enumerate(small_statements):
+            if (isinstance(small, cst.Assign) and len(small.targets) == 1
+                    and isinstance(small.targets[0].target, cst.Name)
+                    and small.targets[0].target.value == "OPENAI_PRICING"):
+                small_statements[j] = small.with_changes(
+                    value=cst.parse_expression(pricing_dict))
+                body[i] = statement.with_changes(body=small_statements)
+                return module.with_changes(body=body).code
+    return None
+
 
 class OpenAIPricingUpdater:
     """Updates OpenAI pricing from various sources."""
 
+    # Project root, resolved once at import
+    _BASE = Path(__file__).resolve().parent
+
     def __init__(self):
-        self.config_path = Path(__file__).parent / \
-            "config" / "openai_pricing.json"
-        self.token_tracker_path = Path(
-            __file__).parent / "src" / "token_tracker.py"
+        self.config_path = self._BASE / "config" / "openai_pricing.json"
+        self.token_tracker_path = self._BASE / "src" / "token_tracker.py"
 
     def fetch_pricing_web_scrape(self) -> Optional[Dict[str, Any]]:
         """
@@ -40,22 +158,23 @@ class OpenAIPricingUpdater:
         Note: This is fragile and may break if OpenAI changes their page structure.
         """
         try:
+            # The HTML parser is imported only when scraping runs
+            from bs4 import BeautifulSoup
+
             url = "https://openai.com/pricing"
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-            }
 
-            response = requests.get(url, headers=headers, timeout=10)
-            response.raise_for_status()
+            content = _fetch_bytes(url)
+            if content is None:
+                print("Error scraping pricing: pricing page unavailable")
+                return None
 
-            soup = BeautifulSoup(response.content, 'html.parser')
+            soup = BeautifulSoup(content, HTML_PARSER)
 
             # This is a simplified example - actual implementation would need
             # to parse the specific HTML structure of OpenAI's pricing page
             pricing_data = self._parse_pricing_from_html(soup)
 
             if pricing_data:
-                pricing_data["last_updated"] = datetime.now().isoformat()
                 pricing_data["source"] = "web_scrape"
                 return pricing_data
 
@@ -63,7 +182,7 @@ class OpenAIPricingUpdater:
             print(f"Error scraping pricing: {e}")
             return None
 
-    def _parse_pricing_from_html(self, soup: BeautifulSoup) -> Optional[Dict[str, Any]]:
+    def _parse_pricing_from_html(self, soup: "BeautifulSoup") -> Optional[Dict[str, Any]]:
         """
         Parse pricing data from HTML soup.
         This would need to be updated based on OpenAI's actual page structure.
@@ -85,13 +204,10 @@ class OpenAIPricingUpdater:
 
         for api_url in apis_to_try:
             try:
-                response = requests.get(api_url, timeout=10)
-                if response.status_code == 200:
-                    data = response.json()
-                    if self._validate_pricing_data(data):
-                        data["last_updated"] = datetime.now().isoformat()
-                        data["source"] = "external_api"
-                        return data
+                data = _fetch_json(api_url)
+                if data is not None and self._validate_pricing_data(data):
+                    data["source"] = "external_api"
+                    return data
             except Exception as e:
                 print(f"Error fetching from {api_url}: {e}")
                 continue
@@ -106,14 +222,11 @@ class OpenAIPricingUpdater:
         try:
             # Example: Community-maintained pricing data
             url = "https://raw.githubusercontent.com/community/openai-pricing/main/pricing.json"
-            response = requests.get(url, timeout=10)
+            data = _fetch_json(url)
 
-            if response.status_code == 200:
-                data = response.json()
-                if self._validate_pricing_data(data):
-                    data["last_updated"] = datetime.now().isoformat()
-                    data["source"] = "github_community"
-                    return data
+            if data is not None and self._validate_pricing_data(data):
+                data["source"] = "github_community"
+                return data
 
         except Exception as e:
             print(f"Error fetching from GitHub: {e}")
@@ -126,24 +239,19 @@ class OpenAIPricingUpdater:
             return False
 
         # Check for required models
-        required_models = ["gpt-3.5-turbo", "gpt-4", "gpt-4-turbo"]
-
-        for model in required_models:
-            if model not in data:
-                return False
-            if not isinstance(data[model], dict):
-                return False
-            if "input" not in data[model] or "output" not in data[model]:
-                return False
+        if REQUIRED_PRICING_MODELS - data.keys():
+            return False
 
-        return True
+        return all(
+            isinstance(prices := data[model], dict) and "input" in prices and "output" in prices
+            for model in REQUIRED_PRICING_MODELS
+        )
 
     def load_current_pricing(self) -> Dict[str, Any]:
         """Load current pricing from config file."""
         try:
             if self.config_path.exists():
-                with open(self.config_path, 'r') as f:
-                    return json.load(f)
+                return _load_json(self.config_path.read_bytes())
         except Exception as e:
             print(f"Error loading current pricing: {e}")
 
@@ -156,8 +264,7 @@ class OpenAIPricingUpdater:
             # Create config directory if it doesn't exist
             self.config_path.parent.mkdir(exist_ok=True)
 
-            with open(self.config_path, 'w') as f:
-                json.dump(pricing_data, f, indent=2)
+            self.config_path.write_bytes(_dump_json(pricing_data))
 
             print(f"Pricing saved to {self.config_path}")
             return True
@@ -175,27 +282,17 @@ class OpenAIPricingUpdater:
                 return False
 
             # Read current file
-            with open(self.token_tracker_path, 'r') as f:
-                content = f.read()
+            content = self.token_tracker_path.read_text(encoding='utf-8')
 
             # Create new pricing dictionary string
             pricing_dict = self._format_pricing_dict(pricing_data)
 
             # Replace the OPENAI_PRICING dictionary
-            import re
-            pattern = r'OPENAI_PRICING\s*=\s*{[^}]*(?:{[^}]*}[^}]*)*}'
-
-            if re.search(pattern, content, re.DOTALL):
-                new_content = re.sub(
-                    pattern,
-                    f'OPENAI_PRICING = {pricing_dict}',
-                    content,
-                    flags=re.DOTALL
-                )
+            new_content = _replace_pricing_literal(content, pricing_dict)
 
+            if new_content is not None:
                 # Write updated content
-                with open(self.token_tracker_path, 'w') as f:
-                    f.write(new_content)
+                self.token_tracker_path.write_text(new_content, encoding='utf-8')
 
                 print(f"Updated token_tracker.py with new pricing")
                 return True
@@ -209,77 +306,114 @@ class OpenAIPricingUpdater:
 
     def _format_pricing_dict(self, pricing_data: Dict[str, Any]) -> str:
         """Format pricing data as Python dictionary string."""
-        lines = ["{"]
-
-        # Group models by type
-        gpt4_models = {k: v for k, v in pricing_data.items()
-                       if k.startswith("gpt-4")}
-        gpt35_models = {k: v for k, v in pricing_data.items()
-                        if k.startswith("gpt-3.5")}
-        embedding_models = {k: v for k,
-                            v in pricing_data.items() if "embedding" in k}
-
-        if gpt4_models:
-            lines.append("    # GPT-4 models")
-            for model, prices in gpt4_models.items():
-                lines.append(
-                    f'    "{model}": {{"input": {prices["input"]}, "output": {prices["output"]}}},')
-            lines.append("")
-
-        if gpt35_models:
-            lines.append("    # GPT-3.5 models")
-            for model, prices in gpt35_models.items():
-                lines.append(
-                    f'    "{model}": {{"input": {prices["input"]}, "output": {prices["output"]}}},')
-            lines.append("")
-
-        if embedding_models:
-            lines.append("    # Embedding models")
-            for model, prices in embedding_models.items():
-                lines.append(
-                    f'    "{model}": {{"input": {prices["input"]}, "output": {prices["output"]}}},')
+        # Group models by type in a single pass
+        groups = {"# GPT-4 models": [], "# GPT-3.5 models": [], "# Embedding models": []}
+        for model, prices in pricing_data.items():
+            if model.startswith("gpt-4"):
+                group = groups["# GPT-4 models"]
+            elif model.startswith("gpt-3.5"):
+                group = groups["# GPT-3.5 models"]
+            elif "embedding" in model:
+                group = groups["# Embedding models"]
+            else:
+                continue
+            group.append(
+                f'    "{model}": {{"input": {prices["input"]}, "output": {prices["output"]}}},')
 
+        # Non-empty groups, each headed by its comment; every group but
+        # embeddings is followed by a blank line
+        lines = ["{"]
+        for header, entries in groups.items():
+            if entries:
+                lines.append(f"    {header}")
+                lines.extend(entries)
+                if header != "# Embedding models":
+                    lines.append("")
         lines.append("}")
         return "\n".join(lines)
 
-    def _get_fallback_pricing(self) -> Dict[str, Any]:
-        """Return fallback pricing data."""
-        return {
-            "gpt-4": {"input": 0.03, "output": 0.06},
-            "gpt-4-turbo": {"input": 0.01, "output": 0.03},
-            "gpt-4-turbo-preview": {"input": 0.01, "output": 0.03},
-            "gpt-4o": {"input": 0.005, "output": 0.015},
-            "gpt-4o-mini": {"input": 0.00015, "output": 0.0006},
-            "gpt-3.5-turbo": {"input": 0.0015, "output": 0.002},
-            "gpt-3.5-turbo-0125": {"input": 0.0005, "output": 0.0015},
-            "gpt-3.5-turbo-instruct": {"input": 0.0015, "output": 0.002},
-            "text-embedding-ada-002": {"input": 0.0001, "output": 0.0},
-            "text-embedding-3-small": {"input": 0.00002, "output": 0.0},
-            "text-embedding-3-large": {"input": 0.00013, "output": 0.0},
-            "last_updated": "2025-07-28",
-            "source": "fallback"
-        }
-
-    def update_pricing(self, method: str = "auto") -> bool:
+    @staticmethod
+    def _get_fallback_pricing() -> Dict[str, Any]:
+        """Return a fresh copy of the fallback pricing data, safe to modify."""
+        return {key: dict(value) if isinstance(value, Mapping) else value
+                for key, value in _FALLBACK_PRICING.items()}
+
+    def _fetch_pricing_auto(self) -> Optional[Dict[str, Any]]:
+        """Run every fetcher at once and keep the most preferred success.
+
+        A result is taken as soon as every method preferred over it has
+        finished without data, so the wait is bounded by the slowest of
+        those fetches rather than their sum.
+        """
+        # Methods in order of preference
+        methods = [
+            ("github", self.fetch_pricing_github_repo),
+            ("external_api", self.fetch_pricing_external_api),
+            ("web_scrape", self.fetch_pricing_web_scrape),
+        ]
+
+        # Daemon threads, so fetchers still running when a result is taken
+        # do not hold up interpreter exit the way executor workers would
+        finished = queue.Queue()
+
+        def run(name, fetch):
+            result = None
+            try:
+                result = fetch()
+            finally:
+                finished.put((name, result))
+
+        for name, fetch in methods:
+            print(f"Trying method: {name}")
+            threading.Thread(target=run, args=(name, fetch), daemon=True).start()
+
+        results = {}
+        for _ in methods:
+            done_name, result = finished.get()
+            results[done_name] = result
+            for name, _ in methods:
+                if name not in results:
+                    # A preferred method is still running
+                    break
+                if results[name]:
+                    return results[name]
+        return None
+
+    def is_config_fresh(self) -> bool:
+        """Check whether the saved config was updated within PRICING_FRESHNESS_DAYS."""
+        if not self.config_path.exists():
+            return False
+        try:
+            raw = self.load_current_pricing().get("last_updated", "")
+            # fromisoformat only accepts a "Z" suffix from Python 3.11
+            if isinstance(raw, str) and raw.endswith("Z"):
+                raw = raw[:-1] + "+00:00"
+            last_updated = datetime.fromisoformat(raw)
+            if last_updated.tzinfo is not None:
+                # Saved timestamps are naive local time; fetched ones may
+                # carry an offset
+                last_updated = last_updated.astimezone().replace(tzinfo=None)
+            return (datetime.now() - last_updated).days < PRICING_FRESHNESS_DAYS
+        except (TypeError, ValueError):
+            # Missing or unparseable date: treat the config as stale
+            return False
+
+    def update_pricing(self, method: str = "auto", force: bool = False) -> bool:
         """Update pricing using specified method."""
         print(f"Updating OpenAI pricing using method: {method}")
 
+        # Skip every network fetch while the saved config is recent
+        if method == "auto" and not force and self.is_config_fresh():
+            print(f"Using cached pricing from {self.config_path} "
+                  f"(updated within {PRICING_FRESHNESS_DAYS} days; --force to refresh)")
+            return True
+
+        updated_at = datetime.now().isoformat()
+
         pricing_data = None
 
         if method == "auto":
-            # Try methods in order of preference
-            methods = ["github", "external_api", "web_scrape"]
-            for m in methods:
-                print(f"Trying method: {m}")
-                if m == "github":
-                    pricing_data = self.fetch_pricing_github_repo()
-                elif m == "external_api":
-                    pricing_data = self.fetch_pricing_external_api()
-                elif m == "web_scrape":
-                    pricing_data = self.fetch_pricing_web_scrape()
-
-                if pricing_data:
-                    break
+            pricing_data = self._fetch_pricing_auto()
 
         elif method == "web_scrape":
             pricing_data = self.fetch_pricing_web_scrape()
@@ -292,6 +426,9 @@ class OpenAIPricingUpdater:
             return True
 
         if pricing_data:
+            # Stamped here once, whichever source answered
+            pricing_data["last_updated"] = updated_at
+
             # Save to config file
             if self.save_pricing_config(pricing_data):
                 # Update token tracker
@@ -320,6 +457,11 @@ def main():
         default="auto",
         help="Method to use for fetching pricing"
     )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Fetch pricing even if the saved config is still fresh"
+    )
     parser.add_argument(
         "--config-only",
         action="store_true",
@@ -341,7 +483,7 @@ def main():
             updater.save_pricing_config(example_config)
             print(f"Created example config at {updater.config_path}")
     else:
-        success = updater.update_pricing(args.method)
+        success = updater.update_pricing(args.method, force=args.force)
         sys.exit(0 if success else 1)
 
 